@@ -0,0 +1,106 @@
+import asyncio
+import contextvars
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from FS.Session import current_session
+
+
+class AsyncFileSystem(object):
+    def __init__(self, file_system, max_workers=4, chunk_size=64 * 1024):
+        self._file_system = file_system
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._chunk_size = chunk_size
+        self._reads = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._executor.shutdown)
+
+    async def read(self, file_name):
+        return (await self.read_bytes(file_name)).decode()
+
+    async def read_bytes(self, file_name):
+        key = (self._normalize(file_name), current_session.get())
+        future = self._reads.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._run(self._read_bytes,
+                                                     file_name))
+            self._reads[key] = future
+            future.add_done_callback(
+                lambda done: self._forget_read(key, done))
+        return await asyncio.shield(future)
+
+    async def stream(self, file_name, chunk_size=None):
+        chunk_size = chunk_size or self._chunk_size
+        file = await self._run(self._file_system.open, file_name, 'rb')
+        try:
+            while True:
+                chunk = await self._run(file.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            await self._run(file.close)
+
+    async def write(self, file_name, data):
+        await self.write_bytes(file_name, data.encode())
+
+    async def write_bytes(self, file_name, data):
+        self._forget_reads(file_name)
+        await self._run(self._file_system.write_bytes, file_name, data)
+
+    async def append(self, file_name, data):
+        await self.append_bytes(file_name, data.encode())
+
+    async def append_bytes(self, file_name, data):
+        self._forget_reads(file_name)
+        await self._run(self._file_system.append_bytes, file_name, data)
+
+    async def create(self, file_name):
+        await self._run(self._file_system.create, file_name)
+
+    async def delete(self, file_name):
+        self._forget_reads(file_name)
+        await self._run(self._file_system.delete, file_name)
+
+    async def listdir(self, path='/'):
+        return await self._run(self._file_system.listdir, path)
+
+    async def mkdir(self, path):
+        await self._run(self._file_system.mkdir, path)
+
+    async def sync(self):
+        await self._run(self._file_system.sync)
+
+    def _read_bytes(self, file_name):
+        return bytes(self._file_system.read_bytes(file_name))
+
+    def _forget_read(self, key, future):
+        if self._reads.get(key) is future:
+            del (self._reads[key])
+
+    def _forget_reads(self, file_name):
+        path = self._normalize(file_name)
+        prefix = path.rstrip('/') + '/'
+        for key in [key for key in self._reads
+                    if key[0] == path or key[0].startswith(prefix)]:
+            del (self._reads[key])
+
+    @staticmethod
+    def _normalize(file_name):
+        return posixpath.normpath('/' + file_name.lstrip('/'))
+
+    def _run(self, function, *args):
+        context = contextvars.copy_context()
+        return asyncio.get_running_loop().run_in_executor(
+            self._executor, context.run, function, *args)
+
+    @property
+    def file_system(self):
+        return self._file_system
@@ -0,0 +1,112 @@
+import mmap
+import os
+
+
+class FileBackend(object):
+    def __init__(self, file_name):
+        self._file = open(file_name, 'rb+', buffering=0)
+        self._fd = self._file.fileno()
+
+    def read(self, offset, size):
+        return os.pread(self._fd, size, offset)
+
+    def readinto(self, offset, buffer):
+        return os.preadv(self._fd, [buffer], offset)
+
+    def write(self, offset, data):
+        data = memoryview(data).cast('B')
+        while len(data):
+            written = os.pwrite(self._fd, data, offset)
+            data = data[written:]
+            offset += written
+
+    def flush(self):
+        pass
+
+    def sync(self):
+        os.fsync(self._fd)
+
+    def fileno(self):
+        return self._fd
+
+    def close(self):
+        self._file.close()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+
+class MemoryBackend(object):
+    def __init__(self, size):
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._closed = False
+
+    def read(self, offset, size):
+        return self._view[offset:offset + size]
+
+    def readinto(self, offset, buffer):
+        buffer = memoryview(buffer).cast('B')
+        data = self._view[offset:offset + len(buffer)]
+        buffer[:len(data)] = data
+        return len(data)
+
+    def write(self, offset, data):
+        data = memoryview(data).cast('B')
+        self._view[offset:offset + len(data)] = data
+
+    def flush(self):
+        pass
+
+    def sync(self):
+        pass
+
+    def close(self):
+        self._closed = True
+
+    @property
+    def buffer(self):
+        return self._view
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class MmapBackend(object):
+    def __init__(self, file_name):
+        self._file = open(file_name, 'rb+')
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._view = memoryview(self._mmap)
+
+    def read(self, offset, size):
+        return self._view[offset:offset + size]
+
+    def readinto(self, offset, buffer):
+        buffer = memoryview(buffer).cast('B')
+        data = self._view[offset:offset + len(buffer)]
+        buffer[:len(data)] = data
+        return len(data)
+
+    def write(self, offset, data):
+        data = memoryview(data).cast('B')
+        self._view[offset:offset + len(data)] = data
+
+    def flush(self):
+        self._mmap.flush()
+
+    def sync(self):
+        self._mmap.flush()
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    @property
+    def closed(self):
+        return self._file.closed
@@ -0,0 +1,142 @@
+import socket
+import threading
+from types import MappingProxyType
+from FS.Protocol import Protocol
+from FS.Session import Session
+
+
+class Client(object):
+    def __init__(self, path):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(path)
+        self._buffer = bytearray()
+        self._request_id = 0
+        self._lock = threading.Lock()
+        self._uid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def as_user(self, uid):
+        if uid != self._uid:
+            raise PermissionError('Нет прав')
+        return Session(self, uid)
+
+    def login(self, login, password):
+        self._uid = self._call('login', login, password)
+        return self._uid
+
+    def close(self):
+        self._socket.close()
+
+    def pipeline(self, calls):
+        with self._lock:
+            first_id = self._request_id
+            self._request_id += len(calls)
+            self._socket.sendall(b''.join(
+                Protocol.frame(first_id + number,
+                               Protocol.operations.index(name),
+                               tuple(args))
+                for number, (name, *args) in enumerate(calls)))
+
+            responses = {}
+            while len(responses) < len(calls):
+                data = self._socket.recv(64 * 1024)
+                if not data:
+                    raise ConnectionError('Соединение с сервером разорвано')
+                self._buffer += data
+                for request_id, code, payload in Protocol.frames(
+                        self._buffer):
+                    responses[request_id] = code, Protocol.decode(payload)
+
+        results = []
+        for number in range(len(calls)):
+            code, value = responses[first_id + number]
+            if code == Protocol.error:
+                value = Protocol.unpack_error(value)
+            results.append(value)
+        return results
+
+    def create(self, file_name):
+        self._call('create', file_name)
+
+    def mkdir(self, path):
+        self._call('mkdir', path)
+
+    def rmdir(self, path):
+        self._call('rmdir', path)
+
+    def listdir(self, path='/'):
+        return self._call('listdir', path)
+
+    def read(self, file_name):
+        return self._call('read', file_name)
+
+    def read_bytes(self, file_name):
+        return self._call('read_bytes', file_name)
+
+    def write(self, file_name, data):
+        self._call('write', file_name, data)
+
+    def write_bytes(self, file_name, data):
+        self._call('write_bytes', file_name, data)
+
+    def append(self, file_name, data):
+        self._call('append', file_name, data)
+
+    def append_bytes(self, file_name, data):
+        self._call('append_bytes', file_name, data)
+
+    def pwrite(self, file_name, offset, data):
+        self._call('pwrite', file_name, offset, data)
+
+    def truncate(self, file_name, size):
+        self._call('truncate', file_name, size)
+
+    def copy(self, src, dst):
+        self._call('copy', src, dst)
+
+    def delete(self, file_name):
+        self._call('delete', file_name)
+
+    def rename(self, src, dst):
+        self._call('rename', src, dst)
+
+    def set_permissions(self, file_name, *permissions):
+        self._call('set_permissions', file_name, *permissions)
+
+    def set_owner(self, file_name, owner):
+        self._call('set_owner', file_name, owner)
+
+    def add_user(self, login, password):
+        self._call('add_user', login, password)
+
+    def del_user(self, login):
+        self._call('del_user', login)
+
+    def commit(self):
+        self._call('commit')
+
+    def sync(self):
+        self._call('sync')
+
+    def _call(self, name, *args):
+        result, = self.pipeline([(name,) + args])
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    @property
+    def files_list(self):
+        return self.listdir('/')
+
+    @property
+    def users(self):
+        return MappingProxyType(self._call('users'))
+
+    @property
+    def logins(self):
+        return MappingProxyType(self._call('logins'))
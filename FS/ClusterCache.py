@@ -0,0 +1,183 @@
+import threading
+from collections import OrderedDict
+
+
+class ClusterCache(object):
+    def __init__(self, backend, superblock, capacity=256, write_back=False):
+        self._backend = backend
+        self._capacity = capacity
+        self._write_back = write_back
+        self._cluster_size = superblock.cluster_size
+        self._data_offset = superblock.first_cluster_offset
+
+        self._clusters = OrderedDict()
+        self._dirty = set()
+        self._lock = threading.RLock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._write_backs = 0
+
+    def read(self, offset, size):
+        buffer = bytearray(size)
+        del (buffer[self.readinto(offset, buffer):])
+        return buffer
+
+    def readinto(self, offset, buffer):
+        buffer = memoryview(buffer).cast('B')
+        if offset < self._data_offset or not len(buffer):
+            return self._backend.readinto(offset, buffer)
+
+        first, last = self._span(offset, len(buffer))
+        if last - first >= self._capacity // 2:
+            with self._lock:
+                self._write_dirty(first, last)
+            return self._backend.readinto(offset, buffer)
+
+        with self._lock:
+            self._load(first, last)
+            clusters = self._clusters
+            position = 0
+            for index, start, end in self._pieces(offset, len(buffer)):
+                cluster = clusters[index]
+                clusters.move_to_end(index)
+                buffer[position:position + end - start] = cluster[start:end]
+                position += end - start
+            return position
+
+    def write(self, offset, data):
+        data = memoryview(data).cast('B')
+        if offset < self._data_offset or not len(data):
+            self._backend.write(offset, data)
+            return
+
+        first, last = self._span(offset, len(data))
+        if not self._write_back or last - first >= self._capacity // 2:
+            self._backend.write(offset, data)
+            with self._lock:
+                self._update(offset, data, False)
+            return
+
+        with self._lock:
+            for index, start, end in self._pieces(offset, len(data)):
+                if index not in self._clusters:
+                    if end - start == self._cluster_size:
+                        self._insert(index, bytearray(self._cluster_size))
+                    else:
+                        self._load(index, index)
+            self._update(offset, data, True)
+
+    def flush(self):
+        with self._lock:
+            self._write_dirty()
+        self._backend.flush()
+
+    def sync(self):
+        with self._lock:
+            self._write_dirty()
+        self._backend.sync()
+
+    def close(self):
+        if self._backend.closed:
+            return
+
+        self.flush()
+        self._backend.close()
+
+    def _span(self, offset, size):
+        offset -= self._data_offset
+        return (offset // self._cluster_size,
+                (offset + size - 1) // self._cluster_size)
+
+    def _pieces(self, offset, size):
+        cluster_size = self._cluster_size
+        offset -= self._data_offset
+        end = offset + size
+
+        while offset < end:
+            index, start = divmod(offset, cluster_size)
+            length = min(cluster_size - start, end - offset)
+            yield index, start, start + length
+            offset += length
+
+    def _update(self, offset, data, dirty):
+        clusters = self._clusters
+        position = 0
+        for index, start, end in self._pieces(offset, len(data)):
+            cluster = clusters.get(index)
+            if cluster is not None:
+                cluster[start:end] = data[position:position + end - start]
+                clusters.move_to_end(index)
+                if dirty:
+                    self._dirty.add(index)
+            position += end - start
+
+    def _load(self, first, last):
+        clusters = self._clusters
+        cluster_size = self._cluster_size
+
+        index = first
+        while index <= last:
+            if index in clusters:
+                self._hits += 1
+                index += 1
+                continue
+
+            end = index
+            while end + 1 <= last and end + 1 not in clusters:
+                end += 1
+
+            data = bytearray((end - index + 1) * cluster_size)
+            self._backend.readinto(self._cluster_offset(index), data)
+            for number in range(index, end + 1):
+                start = (number - index) * cluster_size
+                self._insert(number, data[start:start + cluster_size])
+            self._misses += end - index + 1
+            index = end + 1
+
+    def _insert(self, index, cluster):
+        clusters = self._clusters
+        clusters[index] = cluster
+
+        while len(clusters) > self._capacity:
+            evicted, data = clusters.popitem(last=False)
+            if evicted in self._dirty:
+                self._dirty.discard(evicted)
+                self._backend.write(self._cluster_offset(evicted), data)
+                self._write_backs += 1
+            self._evictions += 1
+
+    def _write_dirty(self, first=0, last=None):
+        indexes = sorted(index for index in self._dirty if first <= index and
+                         (last is None or index <= last))
+
+        run = []
+        for index in indexes:
+            if run and index != run[-1] + 1:
+                self._write_run(run)
+                run = []
+            run.append(index)
+        if run:
+            self._write_run(run)
+
+        self._dirty.difference_update(indexes)
+
+    def _write_run(self, run):
+        self._backend.write(self._cluster_offset(run[0]),
+                            b''.join(self._clusters[index] for index in run))
+        self._write_backs += len(run)
+
+    def _cluster_offset(self, index):
+        return self._data_offset + index * self._cluster_size
+
+    @property
+    def closed(self):
+        return self._backend.closed
+
+    @property
+    def stats(self):
+        return {'hits': self._hits, 'misses': self._misses,
+                'evictions': self._evictions,
+                'write_backs': self._write_backs,
+                'dirty': len(self._dirty), 'size': len(self._clusters)}
@@ -0,0 +1,232 @@
+from itertools import compress
+from struct import pack, pack_into, iter_unpack
+from zlib import crc32
+from FS.Exceptions import NoFreeClustersException
+from FS.Inode import Inode
+
+
+class Directory(object):
+    _entry_format = '59sci'
+    _entry_size = 64
+    _empty = 0
+    _used = 1
+    _deleted = 2
+    _max_load = 0.75
+    _states_table = bytes([_empty]) + bytes([_used]) * 255
+
+    def __init__(self, superblock, fat, backend, inode):
+        self._superblock = superblock
+        self._fat = fat
+        self._backend = backend
+        self._inode = inode
+
+        self._ids = None
+        self._slots = None
+        self._states = None
+        self._used_num = 0
+        self._filled_num = 0
+
+    def __len__(self):
+        self.load()
+        return len(self._ids)
+
+    def __iter__(self):
+        self.load()
+        return iter(self._ids)
+
+    def items(self):
+        self.load()
+        return self._ids.items()
+
+    def lookup(self, name):
+        if self._ids is not None:
+            return self._ids.get(name)
+
+        name = bytes(name, 'utf-8')
+        bucket_num = self._bucket_num
+        bucket = crc32(name) % bucket_num
+        extents = self._fat.get_extents(self._inode.first_cluster)
+
+        for step in range(bucket_num):
+            cluster = extents.cluster_at((bucket + step) % bucket_num)
+            data = self._backend.read(self._cluster_offset(cluster),
+                                      self._superblock.cluster_size)
+
+            has_empty = False
+            for entry_name, length, inode_id in iter_unpack(
+                    self._entry_format, data):
+                length = ord(length)
+                if length and entry_name[:length] == name:
+                    return inode_id
+                if not length and inode_id != -1:
+                    has_empty = True
+
+            if has_empty:
+                break
+
+        return None
+
+    def add(self, name, inode_id):
+        self.load()
+
+        capacity = len(self._states)
+        if self._filled_num + 1 > capacity * self._max_load:
+            bucket_num = self._bucket_num
+            if self._used_num + 1 > capacity * self._max_load / 2:
+                bucket_num *= 2
+            if not self.rehash(bucket_num) and self._used_num == capacity:
+                raise NoFreeClustersException(
+                    'Не осталось свободных блоков данных')
+
+        slot = self._find_slot(self._states, name)
+        self._write_entry(slot, name, inode_id)
+        if self._states[slot] == self._empty:
+            self._filled_num += 1
+        self._states[slot] = self._used
+        self._ids[name] = inode_id
+        self._slots[name] = slot
+        self._used_num += 1
+
+    def delete(self, name):
+        self.load()
+
+        slot = self._slots.pop(name)
+        del (self._ids[name])
+        self._write_entry(slot, '', -1)
+        self._states[slot] = self._deleted
+        self._used_num -= 1
+
+    def load(self):
+        if self._ids is not None:
+            return
+
+        superblock = self._superblock
+        backend = self._backend
+
+        entry_size = self._entry_size
+        ids = {}
+        slots = {}
+        states = bytearray()
+        for first_cluster, count in self._fat.get_extents(
+                self._inode.first_cluster):
+            data = bytes(backend.read(self._cluster_offset(first_cluster),
+                                      count * superblock.cluster_size))
+            lengths = data[entry_size - 5::entry_size]
+            inode_ids = memoryview(data).cast('i')[
+                (entry_size - 4) // 4::entry_size // 4].tolist()
+
+            base = len(states)
+            states += lengths.translate(self._states_table)
+            for slot in compress(range(len(lengths)),
+                                 map((-1).__eq__, inode_ids)):
+                if not lengths[slot]:
+                    states[base + slot] = self._deleted
+
+            for slot in compress(range(len(lengths)), lengths):
+                start = slot * entry_size
+                name = data[start:start + lengths[slot]].decode()
+                ids[name] = inode_ids[slot]
+                slots[name] = base + slot
+
+        self._ids = ids
+        self._slots = slots
+        self._states = states
+        self._used_num = len(ids)
+        self._filled_num = len(states) - states.count(self._empty)
+
+    def rehash(self, bucket_num=None):
+        superblock = self._superblock
+        fat = self._fat
+        first_cluster = self._inode.first_cluster
+        cluster_size = superblock.cluster_size
+        slots_per_bucket = cluster_size // self._entry_size
+
+        self.load()
+        if bucket_num is None:
+            bucket_num = len(fat.get_extents(first_cluster))
+
+        extents = fat.get_extents(first_cluster)
+        if len(extents) < bucket_num:
+            added = fat.extend(first_cluster, bucket_num - len(extents))
+            if len(extents) < bucket_num:
+                fat.shrink(first_cluster, len(extents) - added)
+                return False
+
+        buffer = bytearray(bucket_num * cluster_size)
+        states = bytearray(bucket_num * slots_per_bucket)
+        slots = {}
+        for name, inode_id in self._ids.items():
+            slot = self._find_slot(states, name)
+            states[slot] = self._used
+            slots[name] = slot
+
+            name = bytes(name, 'utf-8')
+            pack_into(self._entry_format, buffer, slot * self._entry_size,
+                      name, bytes([len(name)]), inode_id)
+
+        position = 0
+        for cluster, count in extents.runs():
+            length = min(count, bucket_num - position // cluster_size)
+            if length <= 0:
+                break
+            self._backend.write(self._cluster_offset(cluster),
+                                buffer[position:position +
+                                       length * cluster_size])
+            position += length * cluster_size
+
+        self._slots = slots
+        self._states = states
+        self._filled_num = self._used_num
+
+        self._inode.size = bucket_num * cluster_size
+        self._inode.set_directory()
+        Inode.set_inode(superblock.inode_array_offset, self._backend,
+                        self._inode)
+        return True
+
+    def _find_slot(self, states, name):
+        slots_per_bucket = (self._superblock.cluster_size //
+                            self._entry_size)
+        bucket_num = len(states) // slots_per_bucket
+        bucket = crc32(bytes(name, 'utf-8')) % bucket_num
+
+        for step in range(bucket_num):
+            start = (bucket + step) % bucket_num * slots_per_bucket
+            end = start + slots_per_bucket
+
+            slot = states.find(self._empty, start, end)
+            if slot == -1:
+                slot = states.find(self._deleted, start, end)
+            if slot != -1:
+                return slot
+
+        raise NoFreeClustersException('Не осталось свободных блоков данных')
+
+    def _write_entry(self, slot, name, inode_id):
+        slots_per_bucket = (self._superblock.cluster_size //
+                            self._entry_size)
+        bucket, index = divmod(slot, slots_per_bucket)
+        cluster = self._fat.get_extents(
+            self._inode.first_cluster).cluster_at(bucket)
+
+        name = bytes(name, 'utf-8')
+        self._backend.write(
+            self._cluster_offset(cluster) + index * self._entry_size,
+            pack(self._entry_format, name, bytes([len(name)]), inode_id))
+
+    def _cluster_offset(self, cluster_index):
+        return (
+            self._superblock.first_cluster_offset + cluster_index *
+            self._superblock.cluster_size)
+
+    @property
+    def _bucket_num(self):
+        return self._inode.size // self._superblock.cluster_size
+
+    @property
+    def loaded(self):
+        return self._ids is not None
+
+    @property
+    def inode(self):
+        return self._inode
@@ -0,0 +1,37 @@
+class DirtyPages(object):
+    def __init__(self, page_size=4096):
+        self._page_size = page_size
+        self._pages = set()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def mark(self, offset):
+        self._pages.add(offset // self._page_size)
+
+    def mark_all(self, size):
+        self._pages.update(range((size + self._page_size - 1) //
+                                 self._page_size))
+
+    def write(self, buffer, offset, backend):
+        page_size = self._page_size
+        buffer = memoryview(buffer).cast('B')
+
+        for first, last in self._runs():
+            backend.write(offset + first * page_size,
+                          buffer[first * page_size:(last + 1) * page_size])
+
+        self._pages.clear()
+
+    def _runs(self):
+        pages = sorted(self._pages)
+        if not pages:
+            return
+
+        first = last = pages[0]
+        for page in pages[1:]:
+            if page != last + 1:
+                yield first, last
+                first = page
+            last = page
+        yield first, last
@@ -0,0 +1,6 @@
+class NoFreeClustersException(Exception):
+    pass
+
+
+class JournalOverflowException(Exception):
+    pass
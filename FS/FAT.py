@@ -1,43 +1,201 @@
-from struct import pack, unpack, calcsize
+from array import array
+from bisect import bisect_right
+from FS.DirtyPages import DirtyPages
 
 
 class FAT(object):
-    def __init__(self, list, superblock):
-        self._list = list
+    _free_flags = bytes([1] + [0] * 255)
+
+    def __init__(self, table, superblock):
+        self._table = table
         self._superblock = superblock
 
+        self._free = self._free_map(table, superblock.data_cluster_num)
+        self._cursor = 0
+        self._dirty = DirtyPages()
+        self._extents = {}
+
     def set(self, index, value):
-        before = self._list[index]
-        self._list[index] = value
+        before = self._table[index]
+        self._table[index] = value
+        self._dirty.mark(index * self._table.itemsize)
         if before == 0 and value != 0:
             self._superblock.decrease_free_cluster_num()
+            self._free[index] = 0
         elif before != 0 and value == 0:
             self._superblock.increase_free_cluster_num()
+            self._free[index] = 1
+
+    def write(self, fat_offset, backend):
+        self._dirty.write(self._table, fat_offset, backend)
+
+    def mark_dirty(self):
+        self._dirty.mark_all(len(self._table) * self._table.itemsize)
+
+    @property
+    def dirty(self):
+        return len(self._dirty) > 0
 
-    def write(self, fat_offset, file):
-        file.seek(fat_offset)
-        file.write(pack('%di' % len(self._list), *self._list))
+    def get_free_cluster(self, near=None):
+        free = self._free
 
-    def get_free_cluster(self):
-        return self._list.index(0)
+        start = self._cursor if near is None else near + 1
+        if start >= len(free):
+            start = 0
+
+        index = free.find(1, start)
+        if index == -1:
+            index = free.find(1, 0, start)
+            if index == -1:
+                raise ValueError('Не осталось свободных кластеров')
+
+        self._cursor = index + 1
+        return index
 
     def get_clusters_chain(self, first_cluster):
         clusters = [first_cluster]
 
-        next = self._list[first_cluster]
+        next = self._table[first_cluster]
         while next != -1:
             clusters.append(next)
-            next = self._list[next]
+            next = self._table[next]
 
         return clusters
 
+    def get_extents(self, first_cluster):
+        extents = self._extents.get(first_cluster)
+        if extents is None:
+            extents = Extents(first_cluster)
+
+            table = self._table
+            next = table[first_cluster]
+            while next != -1:
+                extents.append(next)
+                next = table[next]
+
+            self._extents[first_cluster] = extents
+
+        return extents
+
+    def allocate(self):
+        first_cluster = self.get_free_cluster()
+        self.set(first_cluster, -1)
+        self._extents[first_cluster] = Extents(first_cluster)
+        return first_cluster
+
+    def extend(self, first_cluster, count):
+        extents = self.get_extents(first_cluster)
+        superblock = self._superblock
+
+        added = 0
+        while added < count and superblock.free_cluster_num != 0:
+            cluster = self.get_free_cluster(near=extents.tail)
+            self.set(extents.tail, cluster)
+            self.set(cluster, -1)
+            extents.append(cluster)
+            added += 1
+
+        return added
+
+    def shrink(self, first_cluster, count):
+        extents = self.get_extents(first_cluster)
+        if len(extents) <= count:
+            return
+
+        freed = list(extents.clusters(count))
+        self.set(extents.cluster_at(count - 1), -1)
+        for cluster in freed:
+            self.set(cluster, 0)
+
+        extents.truncate(count)
+
+    def reserve(self, first_cluster, count):
+        if any(self._table[first_cluster:first_cluster + count]):
+            return False
+
+        for cluster in range(first_cluster, first_cluster + count):
+            self.set(cluster, -1)
+        return True
+
+    def free(self, first_cluster):
+        for cluster in list(self.get_extents(first_cluster).clusters()):
+            self.set(cluster, 0)
+
+        del self._extents[first_cluster]
+
+    @staticmethod
+    def _free_map(table, size):
+        itemsize = table.itemsize
+        raw = memoryview(table).cast('B')[:size * itemsize]
+
+        used = 0
+        for byte in range(itemsize):
+            used |= int.from_bytes(raw[byte::itemsize], 'little')
+
+        return bytearray(used.to_bytes(size, 'little').translate(
+            FAT._free_flags))
+
     @staticmethod
     def empty(size, superblock):
-        return FAT([0] * size, superblock)
+        fat = FAT(array('i', [0]) * size, superblock)
+        fat.mark_dirty()
+        return fat
 
     @staticmethod
-    def read(fat_size, fat_offset, file, superblock):
-        format = '%di' % fat_size
-        file.seek(fat_offset)
-        return FAT(list(unpack(format, file.read(calcsize(format)))),
-                   superblock)
+    def read(fat_size, fat_offset, backend, superblock):
+        table = array('i', [0]) * fat_size
+        backend.readinto(fat_offset, table)
+        return FAT(table, superblock)
+
+
+class Extents(object):
+    __slots__ = ('_starts', '_counts', '_offsets', '_length')
+
+    def __init__(self, first_cluster):
+        self._starts = array('i', [first_cluster])
+        self._counts = array('i', [1])
+        self._offsets = array('i', [0])
+        self._length = 1
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return zip(self._starts, self._counts)
+
+    def append(self, cluster):
+        if cluster == self._starts[-1] + self._counts[-1]:
+            self._counts[-1] += 1
+        else:
+            self._starts.append(cluster)
+            self._counts.append(1)
+            self._offsets.append(self._length)
+        self._length += 1
+
+    def truncate(self, length):
+        index = bisect_right(self._offsets, length - 1) - 1
+
+        del self._starts[index + 1:]
+        del self._counts[index + 1:]
+        del self._offsets[index + 1:]
+        self._counts[index] = length - self._offsets[index]
+        self._length = length
+
+    def cluster_at(self, number):
+        index = bisect_right(self._offsets, number) - 1
+        return self._starts[index] + number - self._offsets[index]
+
+    def runs(self, number=0):
+        index = bisect_right(self._offsets, number) - 1
+        skip = number - self._offsets[index]
+
+        yield self._starts[index] + skip, self._counts[index] - skip
+        yield from zip(self._starts[index + 1:], self._counts[index + 1:])
+
+    def clusters(self, number=0):
+        for start, count in self.runs(number):
+            yield from range(start, start + count)
+
+    @property
+    def tail(self):
+        return self._starts[-1] + self._counts[-1] - 1
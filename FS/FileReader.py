@@ -0,0 +1,73 @@
+import io
+
+
+class FileReader(io.RawIOBase):
+    def __init__(self, superblock, fat, backend, inode, lock):
+        super().__init__()
+        self._superblock = superblock
+        self._fat = fat
+        self._backend = backend
+        self._inode = inode
+        self._lock = lock
+        self._first_cluster = inode.first_cluster
+
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        cluster_size = self._superblock.cluster_size
+        position = self._position
+
+        offset = position % cluster_size
+        with self._lock.reading():
+            size = min(len(buffer), self._current_size() - position,
+                       cluster_size - offset)
+            if size <= 0:
+                return 0
+
+            cluster = self._find_cluster(position // cluster_size)
+            with memoryview(buffer) as view:
+                self._backend.readinto(
+                    self._cluster_offset(cluster) + offset,
+                    view.cast('B')[:size])
+
+        self._position += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            with self._lock.reading():
+                position = self._current_size() + offset
+        else:
+            raise ValueError('Неверный параметр whence')
+
+        if position < 0:
+            raise ValueError('Отрицательная позиция в файле')
+
+        self._position = position
+        return position
+
+    def tell(self):
+        return self._position
+
+    def _current_size(self):
+        if self._inode.first_cluster != self._first_cluster:
+            return 0
+        return self._inode.size
+
+    def _find_cluster(self, number):
+        return self._fat.get_extents(self._first_cluster).cluster_at(number)
+
+    def _cluster_offset(self, cluster_index):
+        return (
+            self._superblock.first_cluster_offset + cluster_index *
+            self._superblock.cluster_size)
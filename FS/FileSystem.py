@@ -1,67 +1,229 @@
+import fcntl
+import io
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from struct import calcsize
+from types import MappingProxyType
 from time import time
 import bcrypt
+from FS.Backend import FileBackend, MemoryBackend
+from FS.ClusterCache import ClusterCache
+from FS.Exceptions import NoFreeClustersException
+from FS.FileReader import FileReader
 from FS.SuperBlock import SuperBlock
 from FS.FAT import FAT
 from FS.InodeMap import InodeMap
-from FS.Inode import Inode
+from FS.Journal import Journal
+from FS.Inode import Inode, InodeTable
+from FS.InodeLocks import InodeLocks
+from FS.ReadWriteLock import ReadWriteLock
 from FS.Root import Root
+from FS.Session import Session, current_session
+
+
+def _exclusive(method):
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock.writing():
+            return method(self, *args, **kwargs)
+    
+    return locked
+
+
+def _shared(method):
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock.reading():
+            result = method(self, *args, **kwargs)
+        if self._commit_due and not self._lock.read_owned:
+            with self._lock.writing():
+                if self._commit_due:
+                    self.commit()
+        return result
+    
+    return locked
 
 
 class FileSystem(object):
-    def __init__(self, file_name, uid=0):
-        self._file = open(file_name, 'rb+')
-        self._superblock = SuperBlock.read(self._file)
-        self._fat = FAT.read(self._superblock.cluster_num,
-                             self._superblock.fat_offset, self._file,
-                             self._superblock)
-        
-        self._inode_map = InodeMap.read(self._superblock.cluster_num,
-                                        self._superblock.inode_map_offset,
-                                        self._file)
-        self._root = Root(self._superblock, self._fat, self._file)
-        self._uid = uid
+    def __init__(self, file_name, uid=0, backend=FileBackend,
+                 lazy_inodes=False, cache_size=256, write_back=False,
+                 group_commit=32, inode_cache_size=1024):
+        self._lock = ReadWriteLock()
+        self._allocation_lock = threading.RLock()
+        self._inode_locks = InodeLocks()
+        self._commit_due = False
+        
+        self._log_backend = backend(file_name)
+        try:
+            fcntl.flock(self._log_backend.fileno(),
+                        fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._log_backend.close()
+            raise OSError('Образ смонтирован другим процессом')
+        self._backend = self._log_backend
+        self._superblock = SuperBlock.read(self._backend)
+        if cache_size:
+            self._backend = ClusterCache(self._log_backend, self._superblock,
+                                         cache_size, write_back)
+        
+        self._data_backend = self._backend
+        self._journal = Journal(self._superblock, self._backend,
+                                self._log_backend)
+        if self._journal.replay():
+            self._superblock = SuperBlock.read(self._backend)
+        
+        self._group_commit = group_commit
+        self._operations = 0
+        self._batch_depth = 0
+        self._lazy_inodes = lazy_inodes
+        self._inode_cache_size = inode_cache_size
+        self._users = None
+        self._logins = None
+        self._users_inode = None
+        self._load_metadata()
+        self._default_uid = uid
     
     def __del__(self):
-        self._superblock.write(self._file)
-        self._fat.write(self._superblock.fat_offset, self._file)
-        self._inode_map.write(self._superblock.inode_map_offset, self._file)
-        self._file.close()
+        if hasattr(self, '_root'):
+            self.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def as_user(self, uid):
+        return Session(self, uid)
+    
+    @contextmanager
+    def batch(self):
+        with self._lock.writing():
+            if self._batch_depth:
+                self._batch_depth += 1
+                try:
+                    yield self
+                finally:
+                    self._batch_depth -= 1
+                return
+            
+            self.commit()
+            self._batch_depth = 1
+            self._data_backend = self._journal
+            try:
+                yield self
+                self.commit(atomic=True)
+            except BaseException:
+                self._journal.discard()
+                self._superblock = SuperBlock.read(self._backend)
+                self._load_metadata()
+                raise
+            finally:
+                self._batch_depth = 0
+                self._data_backend = self._backend
+    
+    @_exclusive
+    def commit(self, atomic=False):
+        journal = self._journal
+        
+        with self._allocation_lock:
+            self._superblock.write(journal)
+            self._fat.write(self._superblock.fat_offset, journal)
+            self._inode_map.write(self._superblock.inode_map_offset, journal)
+            journal.commit(atomic)
+            self._operations = 0
+            self._commit_due = False
     
+    @_exclusive
+    def sync(self):
+        self.commit()
+        self._journal.checkpoint()
+    
+    @_exclusive
+    def close(self):
+        if self._backend.closed:
+            return
+        
+        self.sync()
+        self._backend.close()
+    
+    @_exclusive
     def create(self, file_name):
-        superblock = self._superblock
+        inode = self._new_inode(file_name)
+        try:
+            self._root.add(file_name, inode)
+        except (FileNotFoundError, NotADirectoryError,
+                NoFreeClustersException):
+            self._fat.free(inode.first_cluster)
+            raise
+        self._inode_map.set(inode.id, False)
+        self._operation_done()
+    
+    @_exclusive
+    def mkdir(self, path):
+        inode = self._new_inode(path)
+        try:
+            self._root.mkdir(path, inode)
+        except (FileNotFoundError, NotADirectoryError,
+                NoFreeClustersException):
+            self._fat.free(inode.first_cluster)
+            raise
+        self._inode_map.set(inode.id, False)
+        self._operation_done()
+    
+    @_exclusive
+    def rmdir(self, path):
         fat = self._fat
-        inode_map = self._inode_map
         root = self._root
+        uid = self._uid
         
-        if file_name in root.list:
-            raise FileExistsError('Файл с данным именем уже существует')
+        if not root.contains(path):
+            raise FileNotFoundError('Файл с таким именем отсутствует')
         
-        if superblock.free_cluster_num == 0:
-            raise NoFreeClustersException(
-                'Не осталось свободных блоков данных')
+        inode = root.read(path)
+        if uid != 0:
+            if inode.uid == uid and not inode.owner_write:
+                raise PermissionError('Нет прав')
+            elif inode.uid != uid and not inode.other_write:
+                raise PermissionError('Нет прав')
         
-        if len(file_name) > 59:
-            raise ValueError('Имя файла должно быть не более 59 символов')
+        if not inode.directory:
+            raise NotADirectoryError('Не является каталогом')
+        if inode.id == 0:
+            raise PermissionError('Нельзя удалить корневой каталог')
+        if root.listdir(path):
+            raise OSError('Каталог не пуст')
         
-        inode_id = inode_map.get_free_inode()
-        now = int(time())
-        first_cluster = fat.get_free_cluster()
-        inode = Inode(inode_id, uid=self._uid, ctime=now, mtime=now,
-                      first_cluster=first_cluster)
-        inode.set_permissions(owner_read=True, owner_write=True,
-                              other_read=True, other_write=False)
-        fat.set(index=first_cluster, value=-1)
-        inode_map.set(inode.id, False)
-        root.add(file_name, inode)
+        root.delete(path)
+        self._revoke_clusters(inode.first_cluster)
+        fat.free(inode.first_cluster)
+        
+        self._inode_map.set(inode.id, True)
+        self._operation_done()
+    
+    @_shared
+    def listdir(self, path='/'):
+        root = self._root
+        
+        if not root.contains(path):
+            raise FileNotFoundError('Файл с таким именем отсутствует')
+        
+        files = root.listdir(path)
+        return MappingProxyType({name: files[name].copy() for name in files})
     
     def read(self, file_name):
+        return self.read_bytes(file_name).decode()
+    
+    @_shared
+    def read_bytes(self, file_name):
         superblock = self._superblock
         fat = self._fat
         root = self._root
-        file = self._file
+        backend = self._data_backend
         uid = self._uid
         
-        if file_name not in root.list:
+        if not root.contains(file_name):
             raise FileNotFoundError('Файл с таким именем отсутствует')
         
         inode = root.read(file_name)
@@ -71,26 +233,79 @@ class FileSystem(object):
             elif inode.uid != uid and not inode.other_read:
                 raise PermissionError('Нет прав')
         
-        clusters = fat.get_clusters_chain(inode.first_cluster)
+        if inode.directory:
+            raise IsADirectoryError('Является каталогом')
         
-        buffer = []
-        for cluster_index in clusters:
-            file.seek(self._cluster_offset(cluster_index))
-            buffer.append(file.read(superblock.cluster_size))
+        cluster_size = superblock.cluster_size
         
-        buffer = b''.join(buffer)[:inode.size]
-        return buffer.decode()
+        with self._inode_locks.get(inode.id).reading():
+            size = inode.size
+            buffer = bytearray(size)
+            view = memoryview(buffer)
+            position = 0
+            for first_cluster, count in fat.get_extents(inode.first_cluster):
+                if position >= size:
+                    break
+                
+                length = min(count * cluster_size, size - position)
+                backend.readinto(self._cluster_offset(first_cluster),
+                                 view[position:position + length])
+                position += length
+            
+            view.release()
+        return buffer
+    
+    @_shared
+    def open(self, file_name, mode='r'):
+        root = self._root
+        uid = self._uid
+        
+        if mode not in ('r', 'rb'):
+            raise ValueError('Неподдерживаемый режим открытия файла')
+        
+        if not root.contains(file_name):
+            raise FileNotFoundError('Файл с таким именем отсутствует')
+        
+        inode = root.read(file_name)
+        if uid != 0:
+            if inode.uid == uid and not inode.owner_read:
+                raise PermissionError('Нет прав')
+            elif inode.uid != uid and not inode.other_read:
+                raise PermissionError('Нет прав')
+        
+        if inode.directory:
+            raise IsADirectoryError('Является каталогом')
+        
+        reader = io.BufferedReader(
+            FileReader(self._superblock, self._fat, self._data_backend,
+                       inode, self._inode_locks.get(inode.id)),
+            buffer_size=self._superblock.cluster_size)
+        if mode == 'rb':
+            return reader
+        return io.TextIOWrapper(reader, encoding='utf-8')
     
     def write(self, file_name, data):
-        superblock = self._superblock
-        fat = self._fat
-        file = self._file
+        self.write_bytes(file_name, data.encode())
+    
+    def write_bytes(self, file_name, data):
+        self._create_missing(file_name)
+        self._write_bytes(file_name, data)
+    
+    def append(self, file_name, data):
+        self.append_bytes(file_name, data.encode())
+    
+    def append_bytes(self, file_name, data):
+        self._create_missing(file_name)
+        self._append_bytes(file_name, data)
+    
+    @_shared
+    def _write_bytes(self, file_name, data):
         root = self._root
-        cluster_offset = self._cluster_offset
         uid = self._uid
         
-        if file_name not in root.list:
-            self.create(file_name)
+        if not root.contains(file_name):
+            raise FileNotFoundError('Файл с таким именем отсутствует')
+        
         inode = root.read(file_name)
         if uid != 0:
             if inode.uid == uid and not inode.owner_write:
@@ -98,54 +313,49 @@ class FileSystem(object):
             elif inode.uid != uid and not inode.other_write:
                 raise PermissionError('Нет прав')
         
-        clusters = fat.get_clusters_chain(inode.first_cluster)
+        if inode.directory:
+            raise IsADirectoryError('Является каталогом')
         
-        data = bytes(data, 'utf-8')
+        data = memoryview(data).cast('B')
+        with self._inode_locks.get(inode.id).writing():
+            if len(data) < inode.size:
+                self._truncate(file_name, inode, len(data))
+            self._pwrite(file_name, inode, 0, data)
+        self._operation_done()
+    
+    @_shared
+    def _append_bytes(self, file_name, data):
+        root = self._root
+        uid = self._uid
         
-        len_old_data = inode.size
+        if not root.contains(file_name):
+            raise FileNotFoundError('Файл с таким именем отсутствует')
         
-        cluster_size = superblock.cluster_size
+        inode = root.read(file_name)
+        if uid != 0:
+            if inode.uid == uid and not inode.owner_write:
+                raise PermissionError('Нет прав')
+            elif inode.uid != uid and not inode.other_write:
+                raise PermissionError('Нет прав')
         
-        for index, cluster_index in enumerate(clusters):
-            file.seek(cluster_offset(cluster_index))
-            file.write(data[index * cluster_size:(index + 1) * cluster_size])
+        if inode.directory:
+            raise IsADirectoryError('Является каталогом')
         
-        if len(data) > len_old_data:
-            prev_cluster_index = clusters[-1]
-            
-            end_clusters = (index + 1) * cluster_size
-            
-            for index in range(end_clusters, len(data), cluster_size):
-                if superblock.free_cluster_num == 0:
-                    inode.size = index
-                    inode.set_mtime()
-                    root.update_inode(file_name, inode)
-                    raise NoFreeClustersException(
-                        'Не осталось свободных блоков данных')
-                
-                cluster_index = fat.get_free_cluster()
-                fat.set(index=prev_cluster_index, value=cluster_index)
-                
-                file.seek(cluster_offset(cluster_index))
-                file.write(data[index:(index + cluster_size)])
-                fat.set(index=cluster_index, value=-1)
-                
-                prev_cluster_index = cluster_index
-        
-        inode.size = len(data)
-        inode.set_mtime()
-        root.update_inode(file_name, inode)
+        with self._inode_locks.get(inode.id).writing():
+            self._pwrite(file_name, inode, inode.size,
+                         memoryview(data).cast('B'))
+        self._operation_done()
     
-    def append(self, file_name, data):
-        superblock = self._superblock
-        fat = self._fat
-        file = self._file
+    @_shared
+    def pwrite(self, file_name, offset, data):
         root = self._root
-        cluster_offset = self._cluster_offset
         uid = self._uid
         
-        if file_name not in root.list:
-            self.create(file_name)
+        if not root.contains(file_name):
+            raise FileNotFoundError('Файл с таким именем отсутствует')
+        
+        if offset < 0:
+            raise ValueError('Отрицательное смещение')
         
         inode = root.read(file_name)
         if uid != 0:
@@ -154,53 +364,55 @@ class FileSystem(object):
             elif inode.uid != uid and not inode.other_write:
                 raise PermissionError('Нет прав')
         
-        clusters = fat.get_clusters_chain(inode.first_cluster)
+        if inode.directory:
+            raise IsADirectoryError('Является каталогом')
         
-        data = bytes(data, 'utf-8')
+        with self._inode_locks.get(inode.id).writing():
+            self._pwrite(file_name, inode, offset,
+                         memoryview(data).cast('B'))
+        self._operation_done()
+    
+    @_shared
+    def truncate(self, file_name, size):
+        root = self._root
+        uid = self._uid
         
-        cluster_size = superblock.cluster_size
-        file.seek(cluster_offset(clusters[-1]) + (inode.size % cluster_size))
-        
-        rest = cluster_size - file.tell() % cluster_size
-        file.write(data[:rest])
-        
-        prev_cluster_index = clusters[-1]
-        for index in range(rest, len(data), cluster_size):
-            if superblock.free_cluster_num == 0:
-                inode.size = index
-                inode.set_mtime()
-                root.update_inode(file_name, inode)
-                raise NoFreeClustersException(
-                    'Не осталось свободных блоков данных')
-            
-            cluster_index = fat.get_free_cluster()
-            fat.set(index=prev_cluster_index, value=cluster_index)
-            
-            file.seek(cluster_offset(cluster_index))
-            file.write(data[index:(index + cluster_size)])
-            fat.set(index=cluster_index, value=-1)
-            
-            prev_cluster_index = cluster_index
+        if not root.contains(file_name):
+            raise FileNotFoundError('Файл с таким именем отсутствует')
         
-        inode.size += len(data)
-        inode.set_mtime()
-        root.update_inode(file_name, inode)
+        if size < 0:
+            raise ValueError('Отрицательный размер файла')
+        
+        inode = root.read(file_name)
+        if uid != 0:
+            if inode.uid == uid and not inode.owner_write:
+                raise PermissionError('Нет прав')
+            elif inode.uid != uid and not inode.other_write:
+                raise PermissionError('Нет прав')
+        
+        if inode.directory:
+            raise IsADirectoryError('Является каталогом')
+        
+        with self._inode_locks.get(inode.id).writing():
+            self._truncate(file_name, inode, size)
+        self._operation_done()
     
     def copy(self, src, dst):
         try:
-            data = self.read(src)
+            data = self.read_bytes(src)
             self.create(dst)
-            self.write(dst, data)
+            self.write_bytes(dst, data)
         except (FileNotFoundError, PermissionError, FileExistsError,
                 NoFreeClustersException):
             raise
     
+    @_exclusive
     def delete(self, file_name):
         fat = self._fat
         root = self._root
         uid = self._uid
         
-        if file_name not in root.list:
+        if not root.contains(file_name):
             raise FileNotFoundError('Файл с таким именем отсутствует')
         
         inode = root.read(file_name)
@@ -210,22 +422,27 @@ class FileSystem(object):
             elif inode.uid != uid and not inode.other_write:
                 raise PermissionError('Нет прав')
         
-        clusters = fat.get_clusters_chain(inode.first_cluster)
+        if inode.directory:
+            raise IsADirectoryError('Является каталогом')
         
-        root.delete(file_name)
-        for cluster in clusters:
-            fat.set(index=cluster, value=0)
+        with self._inode_locks.get(inode.id).writing():
+            root.delete(file_name)
+            self._revoke_clusters(inode.first_cluster)
+            fat.free(inode.first_cluster)
+            inode.size = 0
+        self._invalidate_users(inode)
         
         self._inode_map.set(inode.id, True)
+        self._operation_done()
     
+    @_exclusive
     def rename(self, src, dst):
         root = self._root
-        files_list = root.list
         uid = self._uid
         
-        if src not in files_list:
+        if not root.contains(src):
             raise FileNotFoundError('Файл с таким именем отсутствует')
-        if dst in files_list:
+        if root.contains(dst):
             raise FileExistsError('Файл с таким именем уже существует')
         
         inode = root.read(src)
@@ -235,15 +452,16 @@ class FileSystem(object):
             elif inode.uid != uid and not inode.other_write:
                 raise PermissionError('Нет прав')
         
-        root.delete(src)
-        root.add(dst, inode)
+        root.rename(src, dst)
+        self._invalidate_users(inode)
+        self._operation_done()
     
+    @_exclusive
     def set_permissions(self, file_name, *permissions):
         root = self._root
-        files_list = root.list
         uid = self._uid
         
-        if file_name not in files_list:
+        if not root.contains(file_name):
             raise FileNotFoundError('Файл с таким именем отсутствует')
         
         inode = root.read(file_name)
@@ -254,14 +472,15 @@ class FileSystem(object):
                 raise PermissionError('Нет прав')
         inode.set_permissions(*permissions)
         root.update_inode(file_name, inode)
+        self._operation_done()
     
+    @_exclusive
     def set_owner(self, file_name, owner):
         root = self._root
-        files_list = root.list
         uid = self._uid
-        users = self.users
+        users = self._load_users()
         
-        if file_name not in files_list:
+        if not root.contains(file_name):
             raise FileNotFoundError('Файл с таким именем отсутствует')
         
         if owner not in users:
@@ -276,33 +495,51 @@ class FileSystem(object):
         
         inode.uid = users[owner][0]
         root.update_inode(file_name, inode)
+        self._operation_done()
+    
+    def login(self, login, password):
+        users = self._load_users()
+        if login not in users:
+            raise ValueError('Неверное имя пользователя')
+        
+        uid, hash = users[login]
+        if not bcrypt.checkpw(password.encode(), hash.encode()):
+            raise PermissionError('Неверный пароль')
+        return uid
     
+    @_exclusive
     def add_user(self, login, password):
-        users = self.users
+        users = self._load_users()
+        logins = self._logins
         
         if login in users:
             raise ValueError('Такой пользователь уже существует')
         
-        next_id = max(id for id, hash in users.values()) + 1
+        next_id = max(logins) + 1
         hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
         
-        users[login] = (next_id, hash)
-        
         try:
-            self._write_users(users)
+            self.append('users', '\n{0} {1} {2}'.format(next_id, login, hash))
         except PermissionError:
             raise
+        
+        users[login] = (next_id, hash)
+        logins[next_id] = login
+        self._users = users
+        self._logins = logins
     
+    @_exclusive
     def del_user(self, login):
-        users = self.users
+        users = dict(self._load_users())
         if login not in users:
             raise ValueError('Такого пользователя нет')
         
         uid = users[login][0]
-        for file, inode in self.files_list.items():
-            if inode.uid == uid:
-                inode.uid = 0
-                self._root.update_inode(file, inode)
+        root = self._root
+        for file in root.find_by_uid(uid):
+            inode = root.read(file)
+            inode.uid = 0
+            root.update_inode(file, inode)
         
         del (users[login])
         
@@ -310,6 +547,19 @@ class FileSystem(object):
             self._write_users(users)
         except PermissionError:
             raise
+        
+        self._users = users
+        self._logins = {id: login for login, (id, hash) in users.items()}
+    
+    def _create_missing(self, file_name):
+        with self._lock.reading():
+            if self._root.contains(file_name):
+                return
+        
+        try:
+            self.create(file_name)
+        except FileExistsError:
+            pass
     
     def _write_users(self, users):
         data = '\n'.join(
@@ -320,6 +570,174 @@ class FileSystem(object):
         except PermissionError:
             raise
     
+    def _load_metadata(self):
+        superblock = self._superblock
+        
+        self._fat = FAT.read(superblock.cluster_num, superblock.fat_offset,
+                             self._backend, superblock)
+        if superblock.legacy:
+            self._inode_map = InodeMap.read_legacy(
+                superblock.cluster_num, superblock.inode_map_offset,
+                self._backend)
+        else:
+            self._inode_map = InodeMap.read(superblock.cluster_num,
+                                            superblock.inode_map_offset,
+                                            self._backend)
+        
+        if superblock.version < 3:
+            self._upgrade()
+        
+        self._root = Root(superblock, self._fat, self._journal,
+                          self._lazy_inodes, self._inode_cache_size)
+        self._users = None
+    
+    def _load_users(self):
+        if self._users is None:
+            users = {}
+            for row in self.read('users').split('\n'):
+                if row:
+                    id, login, hash = row.split()
+                    users[login] = (int(id), hash)
+            
+            self._logins = {id: login for login, (id, hash) in users.items()}
+            self._users_inode = self._root.read('users').id
+            self._users = users
+        return self._users
+    
+    def _invalidate_users(self, inode):
+        if inode.id == self._users_inode:
+            self._users = None
+    
+    def _upgrade(self):
+        superblock = self._superblock
+        fat = self._fat
+        
+        legacy = superblock.legacy
+        superblock.upgrade(fat.reserve(
+            superblock.journal_first_cluster,
+            superblock.data_cluster_num - superblock.journal_first_cluster))
+        if legacy:
+            fat.mark_dirty()
+        
+        self._journal = Journal(superblock, self._backend, self._log_backend)
+        self.sync()
+    
+    def _operation_done(self):
+        journal = self._journal
+        
+        with self._allocation_lock:
+            self._operations += 1
+        if self._batch_depth:
+            return
+        if (self._operations >= self._group_commit or
+                journal.pending_size * 2 > journal.size):
+            if self._lock.write_owned:
+                self.commit()
+            else:
+                self._commit_due = True
+    
+    def _new_inode(self, file_name):
+        superblock = self._superblock
+        root = self._root
+        
+        if root.contains(file_name):
+            raise FileExistsError('Файл с данным именем уже существует')
+        
+        if superblock.free_cluster_num == 0:
+            raise NoFreeClustersException(
+                'Не осталось свободных блоков данных')
+        
+        if len(Root.split(file_name)[-1]) > 59:
+            raise ValueError('Имя файла должно быть не более 59 символов')
+        
+        inode_id = self._inode_map.get_free_inode()
+        now = int(time())
+        first_cluster = self._fat.allocate()
+        inode = Inode(inode_id, uid=self._uid, ctime=now, mtime=now,
+                      first_cluster=first_cluster)
+        inode.set_permissions(owner_read=True, owner_write=True,
+                              other_read=True, other_write=False)
+        return inode
+    
+    def _pwrite(self, file_name, inode, offset, data):
+        superblock = self._superblock
+        fat = self._fat
+        backend = self._data_backend
+        root = self._root
+        cluster_offset = self._cluster_offset
+        cluster_size = superblock.cluster_size
+        
+        if offset > inode.size:
+            data = memoryview(bytes(offset - inode.size) + data)
+            offset = inode.size
+        end = offset + len(data)
+        
+        extents = fat.get_extents(inode.first_cluster)
+        
+        clusters_needed = max(1, (end + cluster_size - 1) // cluster_size)
+        if len(extents) < clusters_needed:
+            with self._allocation_lock:
+                fat.extend(inode.first_cluster,
+                           clusters_needed - len(extents))
+        
+        written_end = min(end, len(extents) * cluster_size)
+        
+        number = offset // cluster_size
+        position = offset
+        for first_cluster, count in extents.runs(number):
+            if position >= written_end:
+                break
+            
+            run_end = min(written_end, (number + count) * cluster_size)
+            start = (cluster_offset(first_cluster) + position -
+                     number * cluster_size)
+            if backend is not self._journal:
+                self._journal.revoke(start, run_end - position)
+            backend.write(start, data[position - offset:run_end - offset])
+            position = run_end
+            number += count
+        
+        inode.size = max(inode.size, written_end)
+        inode.set_mtime()
+        with self._allocation_lock:
+            root.update_inode(file_name, inode)
+        self._invalidate_users(inode)
+        
+        if written_end < end:
+            raise NoFreeClustersException(
+                'Не осталось свободных блоков данных')
+    
+    def _truncate(self, file_name, inode, size):
+        fat = self._fat
+        root = self._root
+        cluster_size = self._superblock.cluster_size
+        
+        if size > inode.size:
+            self._pwrite(file_name, inode, inode.size,
+                         memoryview(bytes(size - inode.size)))
+            return
+        
+        count = max(1, (size + cluster_size - 1) // cluster_size)
+        with self._allocation_lock:
+            self._revoke_clusters(inode.first_cluster, count)
+            fat.shrink(inode.first_cluster, count)
+        
+        inode.size = size
+        inode.set_mtime()
+        with self._allocation_lock:
+            root.update_inode(file_name, inode)
+        self._invalidate_users(inode)
+    
+    def _revoke_clusters(self, first_cluster, number=0):
+        cluster_size = self._superblock.cluster_size
+        extents = self._fat.get_extents(first_cluster)
+        if number >= len(extents):
+            return
+        
+        for start, count in extents.runs(number):
+            self._journal.revoke(self._cluster_offset(start),
+                                 count * cluster_size)
+    
     def _cluster_offset(self, cluster_index):
         return (
             self._superblock.first_cluster_offset + cluster_index *
@@ -327,21 +745,18 @@ class FileSystem(object):
     
     @staticmethod
     def format(file_name, password='admin', size=50 * 1024 * 1024):
-        file = open(file_name, 'wb')
-        
-        file.seek(size - 1)
-        file.write(b'\0')
-        
         superblock = SuperBlock.default(size)
         
-        file.seek(superblock.inode_array_offset)
-        inode_table = [Inode(id) for id in range(superblock.cluster_num)]
-        for inode in inode_table:
-            file.write(inode.pack())
-        
         cluster_size = superblock.cluster_size
-        offset = cluster_size - file.tell() % cluster_size
-        superblock.first_cluster_offset = file.tell() + offset
+        offset = (superblock.inode_array_offset +
+                  calcsize(Inode.format) * superblock.cluster_num)
+        superblock.first_cluster_offset = (
+            offset + cluster_size - offset % cluster_size)
+        
+        backend = MemoryBackend(superblock.first_cluster_offset)
+        InodeTable.empty(superblock.cluster_num).write(
+            superblock.inode_array_offset, backend, superblock.cluster_num)
+        
         superblock.free_cluster_num = (
             superblock.cluster_num - superblock.first_cluster_offset //
             cluster_size)
@@ -350,18 +765,37 @@ class FileSystem(object):
         
         inode_map = InodeMap.empty(superblock.free_cluster_num)
         
-        Root.write(superblock, fat, inode_map, file)
+        Root.write(superblock, fat, inode_map, backend)
+        fat.reserve(superblock.journal_first_cluster,
+                    superblock.journal_cluster_num)
         
-        superblock.write(file)
-        fat.write(superblock.fat_offset, file)
-        inode_map.write(superblock.inode_map_offset, file)
+        superblock.write(backend)
+        fat.write(superblock.fat_offset, backend)
+        inode_map.write(superblock.inode_map_offset, backend)
         
-        file.close()
+        with open(file_name, 'wb') as file:
+            file.truncate(size)
+            file.write(backend.buffer)
         
-        fs = FileSystem(file_name, 0)
-        fs.create('users')
-        hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-        fs.write('users', '0 admin %s' % hash)
+        with FileSystem(file_name, 0, lazy_inodes=True, cache_size=0) as fs:
+            fs.create('users')
+            hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+            fs.write('users', '0 admin %s' % hash)
+    
+    @property
+    def _uid(self):
+        session = current_session.get()
+        if session is not None:
+            uid = session.uid_for(self)
+            if uid is not None:
+                return uid
+        return self._default_uid
+    
+    @property
+    def cache(self):
+        if isinstance(self._backend, ClusterCache):
+            return self._backend
+        return None
     
     @property
     def files_list(self):
@@ -369,12 +803,9 @@ class FileSystem(object):
     
     @property
     def users(self):
-        users = {}
-        for row in self.read('users').split('\n'):
-            id, login, hash = row.split()
-            users[login] = (int(id), hash)
-        return users
-
-
-class NoFreeClustersException(Exception):
-    pass
+        return MappingProxyType(self._load_users())
+    
+    @property
+    def logins(self):
+        self._load_users()
+        return MappingProxyType(self._logins)
@@ -1,5 +1,16 @@
+import asyncio
+import socket
 import unittest
+import threading
+from struct import pack
+from FS.AsyncFileSystem import AsyncFileSystem
+from FS.Backend import MmapBackend
+from FS.Client import Client
+from FS.Exceptions import JournalOverflowException
 from FS.FileSystem import FileSystem
+from FS.Inode import Inode
+from FS.Protocol import Protocol
+from FS.Server import Server
 
 
 class MyTestCase(unittest.TestCase):
@@ -130,6 +141,9 @@ class MyTestCase(unittest.TestCase):
 
         fs.add_user('user1', 'password')
         self.assertIn('user1', fs.read('users'))
+        self.assertEqual(fs.login('user1', 'password'), 1)
+        with self.assertRaises(PermissionError):
+            fs.login('user1', 'admin')
 
         fs.del_user('user1')
         self.assertNotIn('user1', fs.read('users'))
@@ -140,6 +154,811 @@ class MyTestCase(unittest.TestCase):
         with self.assertRaises(ValueError):
             fs.add_user('admin', 'password')
 
+    def test_clusters_allocated_contiguously(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+
+        fs.write('file1', '1' * (4096 * 3 - 10))
+        fs.write('file2', '2')
+        fs.append('file1', '1' * 4096 * 2)
+
+        clusters = fs._fat.get_clusters_chain(
+            fs.files_list['file1'].first_cluster)
+        self.assertEqual(len(clusters), 5)
+        self.assertEqual(clusters[:3], list(range(clusters[0],
+                                                  clusters[0] + 3)))
+        self.assertEqual(clusters[3:], list(range(clusters[2] + 2,
+                                                  clusters[2] + 4)))
+
+    def test_remount(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+
+        text = ''.join(str(i) for i in range(10000))
+        fs.write('file1', text)
+        free_cluster_num = fs._superblock.free_cluster_num
+        del fs
+
+        fs = FileSystem('test')
+        self.assertEqual(fs._superblock.free_cluster_num, free_cluster_num)
+
+        fs.write('file2', text[::-1])
+        self.assertEqual(fs.read('file1'), text)
+        self.assertEqual(fs.read('file2'), text[::-1])
+
+    def test_sync_and_close(self):
+        FileSystem.format('test')
+
+        with FileSystem('test') as fs:
+            fs.write('file1', '1' * 10000)
+            self.assertTrue(fs._fat.dirty)
+            self.assertEqual(len(fs._fat._dirty), 1)
+
+            fs.sync()
+            self.assertFalse(fs._fat.dirty)
+            self.assertFalse(fs._inode_map.dirty)
+            self.assertFalse(fs._superblock.dirty)
+
+        fs.close()
+
+        with FileSystem('test') as fs:
+            self.assertEqual(fs.read('file1'), '1' * 10000)
+
+    def test_mmap_backend(self):
+        FileSystem.format('test')
+
+        text = ''.join(str(i) for i in range(10000))
+        with FileSystem('test', backend=MmapBackend) as fs:
+            fs.write('file1', text)
+            fs.append('file1', text)
+            fs.create('file2')
+            fs.delete('file2')
+            self.assertEqual(fs.read('file1'), text * 2)
+
+        with FileSystem('test') as fs:
+            self.assertEqual(sorted(fs.files_list.keys()),
+                             ['file1', 'users'])
+            self.assertEqual(fs.read('file1'), text * 2)
+
+    def test_open(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+
+        lines = ['line %d\n' % i for i in range(2000)]
+        text = ''.join(lines)
+        fs.write('file1', text)
+
+        with fs.open('file1') as file:
+            self.assertEqual(list(file), lines)
+
+        data = text.encode()
+        with fs.open('file1', 'rb') as file:
+            self.assertEqual(file.read(10), data[:10])
+            self.assertEqual(file.tell(), 10)
+
+            file.seek(5000)
+            self.assertEqual(file.read(5000), data[5000:10000])
+
+            file.seek(-10, 2)
+            self.assertEqual(file.read(), data[-10:])
+
+            file.seek(100)
+            buffer = bytearray(9000)
+            self.assertEqual(file.readinto(buffer), 9000)
+            self.assertEqual(buffer, data[100:9100])
+
+        with self.assertRaises(FileNotFoundError):
+            fs.open('file2')
+
+    def test_bytes(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+
+        data = bytes(range(256)) * 100
+        fs.write_bytes('file1', data)
+        self.assertEqual(fs.read_bytes('file1'), data)
+
+        fs.append_bytes('file1', bytearray(b'\xff\xfe'))
+        fs.append_bytes('file1', memoryview(data)[:10])
+        self.assertEqual(fs.read_bytes('file1'),
+                         data + b'\xff\xfe' + data[:10])
+
+        fs.copy('file1', 'file2')
+        self.assertEqual(fs.read_bytes('file2'), fs.read_bytes('file1'))
+
+    def test_extents(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+
+        text = '1' * (4096 * 3 - 10)
+        fs.write('file1', text)
+        fs.write('file2', '2')
+        fs.append('file1', '3' * 4096 * 2)
+
+        first_cluster = fs.files_list['file1'].first_cluster
+        self.assertEqual(list(fs._fat.get_extents(first_cluster)),
+                         [(first_cluster, 3), (first_cluster + 4, 2)])
+        self.assertEqual(fs.read('file1'), text + '3' * 4096 * 2)
+
+        fs.write('file3', '')
+        self.assertEqual(fs.read_bytes('file3'), b'')
+
+    def test_pwrite_and_truncate(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+        free_cluster_num = fs._superblock.free_cluster_num
+
+        data = bytearray(b'0123456789' * 2000)
+        fs.write_bytes('file1', data)
+        self.assertEqual(fs._superblock.free_cluster_num,
+                         free_cluster_num - 5)
+
+        fs.pwrite('file1', 4090, b'abcdefghijkl')
+        data[4090:4102] = b'abcdefghijkl'
+        self.assertEqual(fs.read_bytes('file1'), data)
+
+        fs.pwrite('file1', 20010, b'end')
+        data += bytes(10) + b'end'
+        self.assertEqual(fs.read_bytes('file1'), data)
+
+        fs.truncate('file1', 5000)
+        self.assertEqual(fs.read_bytes('file1'), data[:5000])
+        self.assertEqual(fs._superblock.free_cluster_num,
+                         free_cluster_num - 2)
+
+        fs.truncate('file1', 5010)
+        self.assertEqual(fs.read_bytes('file1'), data[:5000] + bytes(10))
+
+        fs.write('file1', 'short')
+        self.assertEqual(fs.read('file1'), 'short')
+        self.assertEqual(fs._superblock.free_cluster_num,
+                         free_cluster_num - 1)
+
+        fs.write('file2', '1' * 4096)
+        fs.append('file2', '2')
+        self.assertEqual(fs.read('file2'), '1' * 4096 + '2')
+
+        with self.assertRaises(FileNotFoundError):
+            fs.truncate('file3', 0)
+
+    def test_extents_cache(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+        fat = fs._fat
+
+        for i in range(20):
+            fs.append('file1', str(i) * 3000)
+            fs.append('file2', str(i) * 3000)
+        fs.truncate('file1', 10000)
+        fs.append('file1', '1' * 5000)
+
+        for file_name in ('file1', 'file2'):
+            first_cluster = fs.files_list[file_name].first_cluster
+            extents = fat.get_extents(first_cluster)
+            chain = fat.get_clusters_chain(first_cluster)
+
+            self.assertEqual(list(extents.clusters()), chain)
+            self.assertEqual(extents.tail, chain[-1])
+            self.assertEqual([extents.cluster_at(number)
+                              for number in range(len(chain))], chain)
+
+        fs.delete('file1')
+        fs.create('file3')
+        first_cluster = fs.files_list['file3'].first_cluster
+        self.assertEqual(list(fat.get_extents(first_cluster)),
+                         [(first_cluster, 1)])
+
+    def test_directory_slots(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+
+        for i in range(200):
+            fs.create(str(i))
+        for i in range(0, 200, 2):
+            fs.delete(str(i))
+        for i in range(0, 200, 2):
+            fs.create('new%d' % i)
+        fs.rename('1', 'renamed')
+        del fs
+
+        fs = FileSystem('test')
+        expected = (['users', 'renamed'] +
+                    [str(i) for i in range(3, 200, 2)] +
+                    ['new%d' % i for i in range(0, 200, 2)])
+        self.assertEqual(sorted(fs.files_list.keys()), sorted(expected))
+        self.assertEqual(len(fs._fat.get_extents(0)), 8)
+        self.assertEqual(fs._root.read('/').size, 4096 * 8)
+
+    def test_files_list_view(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+
+        files_list = fs.files_list
+        fs.create('file1')
+        self.assertIn('file1', files_list)
+
+        with self.assertRaises(TypeError):
+            files_list['file2'] = files_list['file1']
+
+        self.assertTrue(fs._root.contains('file1'))
+        self.assertIsNone(fs._root.get('file2'))
+
+    def test_lazy_inodes(self):
+        FileSystem.format('test')
+        with FileSystem('test') as fs:
+            for i in range(100):
+                fs.write(str(i), str(i))
+
+        with FileSystem('test', lazy_inodes=True) as fs:
+            inodes = fs._root._inodes
+            self.assertEqual(len(inodes), 1)
+            self.assertEqual(len(fs.files_list), 101)
+
+            fs.set_permissions('0', True, True, False, False)
+            for i in range(10):
+                self.assertEqual(fs.read(str(i)), str(i))
+            self.assertEqual(len(inodes), 11)
+
+        with FileSystem('test', lazy_inodes=True) as fs:
+            self.assertFalse(fs.files_list['0'].other_read)
+            self.assertTrue(fs.files_list['1'].other_read)
+
+        with FileSystem('test', lazy_inodes=True,
+                        inode_cache_size=8) as fs:
+            inodes = fs._root._inodes
+            for i in range(100):
+                self.assertEqual(fs.read(str(i)), str(i))
+                self.assertLessEqual(len(inodes), 8)
+
+            fs.add_user('user', 'password')
+            inode = fs.files_list['5']
+            fs.set_owner('5', 'user')
+            for i in range(50, 100):
+                fs.read(str(i))
+            self.assertIs(fs.files_list['5'], inode)
+            self.assertEqual(inode.uid, fs.users['user'][0])
+            self.assertFalse(fs.files_list['0'].other_read)
+            self.assertEqual(fs._root.find_by_uid(inode.uid), ['5'])
+
+    def test_directories(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+
+        fs.mkdir('dir')
+        fs.mkdir('/dir/sub')
+        fs.write('dir/sub/file', 'text')
+        self.assertEqual(fs.read('/dir/./sub/../sub/file'), 'text')
+        self.assertEqual(sorted(fs.listdir('dir')), ['sub'])
+        self.assertTrue(fs.listdir()['dir'].directory)
+
+        files = fs.listdir('dir/sub')
+        fs.write('dir/sub/other', 'text')
+        self.assertEqual(sorted(files), ['file'])
+        fs.delete('dir/sub/other')
+
+        with self.assertRaises(FileExistsError):
+            fs.mkdir('dir')
+        with self.assertRaises(FileNotFoundError):
+            fs.create('missing/file')
+        with self.assertRaises(NotADirectoryError):
+            fs.create('dir/sub/file/file')
+        with self.assertRaises(IsADirectoryError):
+            fs.read('dir')
+        with self.assertRaises(IsADirectoryError):
+            fs.delete('dir')
+        with self.assertRaises(ValueError):
+            fs.rename('dir', 'dir/sub/dir')
+        with self.assertRaises(OSError):
+            fs.rmdir('dir')
+
+        for i in range(300):
+            fs.create('dir/%d' % i)
+        fs.rename('dir/sub/file', 'moved')
+        fs.rename('dir/sub', 'sub')
+        for i in range(300):
+            fs.delete('dir/%d' % i)
+        fs.rmdir('dir')
+        del fs
+
+        fs = FileSystem('test')
+        self.assertEqual(sorted(fs.files_list), ['moved', 'sub', 'users'])
+        self.assertEqual(fs.read('moved'), 'text')
+        self.assertEqual(len(fs.listdir('sub')), 0)
+        self.assertFalse(fs._root.contains('dir'))
+
+    def test_cluster_cache(self):
+        FileSystem.format('test')
+        with FileSystem('test', cache_size=4) as fs:
+            for i in range(10):
+                fs.read('users')
+            stats = fs.cache.stats
+            self.assertGreaterEqual(stats['hits'], 9)
+            self.assertLessEqual(stats['misses'], 2)
+            self.assertLessEqual(stats['size'], 4)
+
+            for i in range(8):
+                fs.write(str(i), str(i))
+                self.assertEqual(fs.read(str(i)), str(i))
+            self.assertGreater(fs.cache.stats['evictions'], 0)
+            self.assertEqual(fs.read('7'), '7')
+
+        with FileSystem('test', write_back=True) as fs:
+            fs.write('file', 'text')
+            self.assertGreater(fs.cache.stats['dirty'], 0)
+            superblock = fs._superblock
+            fs.commit()
+            data = fs._log_backend.read(
+                superblock.first_cluster_offset +
+                fs.files_list['file'].first_cluster *
+                superblock.cluster_size, 4)
+            self.assertNotEqual(data, b'text')
+
+            fs.sync()
+            self.assertEqual(fs.cache.stats['dirty'], 0)
+
+        with FileSystem('test', cache_size=0) as fs:
+            self.assertIsNone(fs.cache)
+            self.assertEqual(fs.read('file'), 'text')
+
+    def test_journal(self):
+        FileSystem.format('test')
+        fs = FileSystem('test', group_commit=100)
+        free_cluster_num = fs._superblock.free_cluster_num
+        fs.write('lost', 'text')
+        fs._backend.close()
+
+        fs = FileSystem('test', group_commit=100)
+        self.assertNotIn('lost', fs.files_list)
+        self.assertEqual(fs._superblock.free_cluster_num, free_cluster_num)
+
+        fs.mkdir('dir')
+        fs.write('dir/file', 'text')
+        fs._journal._apply = lambda records: None
+        fs.commit()
+        fs._backend.close()
+
+        fs = FileSystem('test')
+        self.assertEqual(fs.read('dir/file'), 'text')
+        self.assertEqual(fs._superblock.free_cluster_num,
+                         free_cluster_num - 2)
+
+    def test_batch(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+
+        writes = []
+        write = fs._backend.write
+        fs._backend.write = lambda offset, data: (writes.append(offset),
+                                                  write(offset, data))
+        with fs.batch():
+            for i in range(100):
+                fs.create(str(i))
+                fs.set_permissions(str(i), True, True, False, False)
+            self.assertEqual(writes, [])
+        self.assertEqual(writes, sorted(writes))
+        self.assertLessEqual(len(writes), 8)
+        del fs._backend.write
+
+        fs.write('file', 'text')
+        free_cluster_num = fs._superblock.free_cluster_num
+        with self.assertRaises(ZeroDivisionError):
+            with fs.batch():
+                fs.write('file', 'other text')
+                fs.mkdir('dir')
+                fs.delete('0')
+                1 / 0
+
+        self.assertEqual(fs.read('file'), 'text')
+        self.assertFalse(fs._root.contains('dir'))
+        self.assertEqual(fs._superblock.free_cluster_num, free_cluster_num)
+        del fs
+
+        fs = FileSystem('test')
+        self.assertEqual(len(fs.files_list), 102)
+        self.assertFalse(fs.files_list['0'].other_read)
+        self.assertEqual(fs.read('file'), 'text')
+
+        free_cluster_num = fs._superblock.free_cluster_num
+        with self.assertRaises(JournalOverflowException):
+            with fs.batch():
+                fs.write('file', 'other text')
+                fs.write('big', 'x' * fs._journal.size)
+        self.assertFalse(fs._root.contains('big'))
+        self.assertEqual(fs.read('file'), 'text')
+        self.assertEqual(fs._superblock.free_cluster_num, free_cluster_num)
+        fs._backend.close()
+
+        fs = FileSystem('test')
+        self.assertFalse(fs._root.contains('big'))
+        self.assertEqual(fs.read('file'), 'text')
+
+    def test_journal_revoke(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+        cluster_size = fs._superblock.cluster_size
+
+        with fs.batch():
+            fs.write('a', 'OLD-A' * 10)
+            fs.write('b', 'OLD-B' * 10)
+            fs.write('c', 'C' * cluster_size * 2)
+        fs.write('a', 'NEW-A' * 10)
+
+        freed = fs.files_list['b'].first_cluster
+        fs.delete('b')
+        fs._fat._cursor = freed
+        fs.write('d', 'NEW-D' * 10)
+        self.assertEqual(fs.files_list['d'].first_cluster, freed)
+
+        freed = fs._fat.get_extents(fs.files_list['c'].first_cluster).tail
+        fs.truncate('c', 10)
+        fs._fat._cursor = freed
+        fs.write('e', 'NEW-E' * 10)
+        self.assertEqual(fs.files_list['e'].first_cluster, freed)
+        fs.commit()
+        fs._backend.close()
+
+        fs = FileSystem('test')
+        self.assertEqual(fs.read('a'), 'NEW-A' * 10)
+        self.assertEqual(fs.read('c'), 'C' * 10)
+        self.assertEqual(fs.read('d'), 'NEW-D' * 10)
+        self.assertEqual(fs.read('e'), 'NEW-E' * 10)
+
+    def test_users_cache(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+
+        users = fs.users
+        self.assertIs(fs._users, fs._load_users())
+        with self.assertRaises(TypeError):
+            users['user'] = (1, '')
+
+        fs.add_user('user', 'password')
+        self.assertEqual(fs.users['user'][0], 1)
+        self.assertEqual(fs.logins[1], 'user')
+        self.assertEqual(len(fs.read('users').split('\n')), 2)
+
+        fs.write('users', fs.read('users').replace('user', 'other'))
+        self.assertIsNone(fs._users)
+        self.assertEqual(fs.logins[1], 'other')
+
+        fs.create('file')
+        fs.set_owner('file', 'other')
+        fs.del_user('other')
+        self.assertEqual(sorted(fs.users), ['admin'])
+        self.assertEqual(fs.files_list['file'].uid, 0)
+        del fs
+
+        fs = FileSystem('test')
+        self.assertEqual(dict(fs.logins), {0: 'admin'})
+
+    def test_sessions(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+        fs.add_user('user', 'password')
+        fs.write('private', 'text')
+        fs.set_permissions('private', True, True, False, False)
+
+        session = fs.as_user(1)
+        self.assertEqual(session.uid, 1)
+        with self.assertRaises(PermissionError):
+            session.read('private')
+        self.assertEqual(fs.read('private'), 'text')
+
+        session.create('own')
+        self.assertEqual(fs.files_list['own'].uid, 1)
+        with fs.as_user(1):
+            fs.write('own', 'text')
+            with self.assertRaises(PermissionError):
+                fs.delete('private')
+        fs.delete('private')
+
+        with self.assertRaises(AttributeError):
+            session._root
+        for name in ('close', 'batch', 'as_user', 'format'):
+            with self.assertRaises(AttributeError):
+                getattr(session, name)
+
+    def test_threads(self):
+        FileSystem.format('test')
+        fs = FileSystem('test', group_commit=4)
+        errors = []
+
+        def work(number):
+            try:
+                file_name = 'file%d' % number
+                for i in range(20):
+                    fs.append_bytes(file_name, bytes([number]) * 1000)
+                    data = fs.read_bytes(file_name)
+                    if data != bytes([number]) * 1000 * (i + 1):
+                        errors.append(file_name)
+                    fs.listdir()
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=work, args=(number,))
+                   for number in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        fs.close()
+
+        fs = FileSystem('test')
+        for number in range(8):
+            self.assertEqual(fs.read_bytes('file%d' % number),
+                             bytes([number]) * 20000)
+
+    def test_read_while_truncating(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+        fs.write_bytes('file1', b'x' * 100000)
+        errors = []
+        done = threading.Event()
+
+        def truncate():
+            try:
+                for i in range(50):
+                    fs.truncate('file1', 100)
+                    fs.write_bytes('file2', b'y' * 100000)
+                    fs.delete('file2')
+                    fs.write_bytes('file1', b'x' * 100000)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                done.set()
+
+        thread = threading.Thread(target=truncate)
+        thread.start()
+        while not done.is_set():
+            with fs.open('file1', 'rb') as file:
+                try:
+                    for chunk in iter(lambda: file.read(4096), b''):
+                        if chunk.strip(b'x'):
+                            errors.append(chunk.strip(b'x')[:10])
+                except Exception as error:
+                    errors.append(error)
+                    break
+        thread.join()
+        self.assertEqual(errors, [])
+
+        with fs.open('file1', 'rb') as file:
+            self.assertEqual(file.read(4096), b'x' * 4096)
+            thread = threading.Thread(target=fs.truncate,
+                                      args=('file1', 100))
+            thread.start()
+            thread.join()
+            self.assertEqual(file.read(), b'')
+            file.seek(0)
+            self.assertEqual(file.read(), b'x' * 100)
+
+    def test_async_file_system(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+        reads = []
+        read_bytes = fs.read_bytes
+        gate = threading.Event()
+        gate.set()
+
+        def counting_read_bytes(file_name):
+            reads.append(file_name)
+            gate.wait()
+            return read_bytes(file_name)
+
+        fs.read_bytes = counting_read_bytes
+
+        async def run():
+            async with AsyncFileSystem(fs) as afs:
+                await afs.write('file1', 'text' * 10000)
+                results = await asyncio.gather(
+                    *[afs.read('file1') for _ in range(10)])
+                self.assertEqual(results, ['text' * 10000] * 10)
+                self.assertEqual(reads, ['file1'])
+
+                await afs.append('file1', 'end')
+                self.assertTrue((await afs.read('file1')).endswith('end'))
+
+                chunks = [chunk async for chunk in
+                          afs.stream('file1', chunk_size=4096)]
+                self.assertEqual(len(chunks), 10)
+                self.assertEqual(b''.join(chunks), b'text' * 10000 + b'end')
+
+                with fs.as_user(1):
+                    await afs.create('own')
+                self.assertEqual(fs.files_list['own'].uid, 1)
+
+                files = await afs.listdir()
+                await afs.delete('own')
+                self.assertNotIn('own', await afs.listdir())
+                self.assertEqual(files['own'].uid, 1)
+                with self.assertRaises(FileNotFoundError):
+                    await afs.read('own')
+
+                del (reads[:])
+                gate.clear()
+                pending = asyncio.gather(afs.read('file1'),
+                                         afs.read('/./file1'))
+                await asyncio.sleep(0)
+                await afs.write('/file1', 'new')
+                fresh = asyncio.ensure_future(afs.read('file1'))
+                await asyncio.sleep(0)
+                gate.set()
+                self.assertEqual(await fresh, 'new')
+                await pending
+                self.assertEqual(reads, ['file1', 'file1'])
+
+                gate.clear()
+                pending = asyncio.ensure_future(afs.read('file1'))
+                await asyncio.sleep(0)
+                threading.Timer(0.5, gate.set).start()
+                closing = asyncio.ensure_future(afs.close())
+                await asyncio.sleep(0.05)
+                self.assertFalse(closing.done())
+                await closing
+                self.assertEqual(await pending, 'new')
+
+        asyncio.run(run())
+        self.assertFalse(fs._backend.closed)
+        fs.close()
+
+    def test_server(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+        server = Server(fs, 'test.sock')
+        server.listen()
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        with Client('test.sock') as first, Client('test.sock') as second:
+            with self.assertRaises(PermissionError):
+                first.read('users')
+            with self.assertRaises(PermissionError):
+                first.login('admin', 'wrong')
+            with self.assertRaises(ValueError):
+                first.login('nobody', 'admin')
+            self.assertEqual(first.login('admin', 'admin'), 0)
+            second.login('admin', 'admin')
+
+            first.write('file1', 'text')
+            self.assertEqual(second.read('file1'), 'text')
+            second.append_bytes('file1', b'\0end')
+            self.assertEqual(first.read_bytes('file1'), b'text\0end')
+
+            files_list = first.listdir()
+            self.assertEqual(sorted(files_list), ['file1', 'users'])
+            self.assertEqual(files_list['file1'].size, 8)
+            self.assertEqual(first.logins[0], 'admin')
+
+            results = first.pipeline([('create', 'file2'),
+                                      ('write', 'file2', 'data'),
+                                      ('read', 'file2'),
+                                      ('read', 'file3')])
+            self.assertEqual(results[:3], [None, None, 'data'])
+            self.assertIsInstance(results[3], FileNotFoundError)
+
+            first.add_user('user', 'password')
+            self.assertEqual(second.users['user'], (1, ''))
+            first.set_permissions('file2', True, True, False, False)
+            with self.assertRaises(PermissionError):
+                second.as_user(1)
+            with self.assertRaises(FileExistsError):
+                second.create('file1')
+
+            with Client('test.sock') as third:
+                self.assertEqual(third.login('user', 'password'), 1)
+                with self.assertRaises(PermissionError):
+                    third.read('file2')
+                with self.assertRaises(PermissionError):
+                    third.as_user(0)
+                self.assertEqual(third.as_user(1).read('file1'), 'text\0end')
+
+        server.close()
+        thread.join()
+        self.assertEqual(fs.read('file2'), 'data')
+
+    def test_server_safety(self):
+        FileSystem.format('test')
+        fs = FileSystem('test')
+        with self.assertRaises(OSError):
+            FileSystem('test')
+        with self.assertRaises(FileExistsError):
+            Server(fs, 'test').listen()
+        self.assertEqual(fs.read('users')[:8], '0 admin ')
+
+        with Server(fs, 'test.sock') as server:
+            with self.assertRaises(FileExistsError):
+                Server(fs, 'test.sock').listen()
+            with self.assertRaises(OSError):
+                FileSystem('test')
+
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            with socket.socket(socket.AF_UNIX) as connection:
+                connection.connect('test.sock')
+                connection.sendall(pack('!IIB', 2, 7, 0) + b'i\0' +
+                                   pack('!IIB', 1, 8, 0) + b'N')
+                buffer = bytearray()
+                frames = []
+                while len(frames) < 2:
+                    buffer += connection.recv(4096)
+                    frames += Protocol.frames(buffer)
+                self.assertEqual([frame[:2] for frame in frames],
+                                 [(7, Protocol.error), (8, Protocol.error)])
+                self.assertEqual(Protocol.decode(frames[0][2]),
+                                 ('ValueError', 'Повреждённый пакет'))
+
+            with Client('test.sock') as client:
+                client.login('admin', 'admin')
+                self.assertIn('users', client.listdir())
+            server.close()
+            thread.join()
+        fs.close()
+
+        with FileSystem('test') as other:
+            self.assertIn('users', other.listdir())
+
+    def test_format_large_image(self):
+        FileSystem.format('test', size=1024 ** 3)
+        fs = FileSystem('test', lazy_inodes=True)
+        superblock = fs._superblock
+        self.assertEqual(superblock.cluster_num, 1024 ** 3 // 4096)
+
+        last = superblock.cluster_num - 1
+        inode = Inode.get_inode(superblock.inode_array_offset, fs._backend,
+                                last)
+        self.assertEqual((inode.id, inode.size, inode.first_cluster),
+                         (last, 0, -1))
+        self.assertTrue(fs._root.read('/').directory)
+        self.assertIn('admin', fs.users)
+
+        fs.write('file1', 'text')
+        fs.close()
+        with FileSystem('test') as fs:
+            self.assertEqual(fs.read('file1'), 'text')
+
+    def test_legacy_image_migration(self):
+        self._format_legacy('test', 1024 * 1024)
+        fs = FileSystem('test')
+        self.assertEqual(fs._superblock.version, 3)
+        self.assertEqual(fs._superblock.journal_cluster_num, 15)
+        self.assertTrue(fs._root.read('/').directory)
+
+        fs.write('file1', 'text')
+        fs.write('file2', 'other text')
+        fs.delete('file1')
+        del fs
+
+        fs = FileSystem('test')
+        self.assertEqual(sorted(fs.files_list.keys()), ['file2'])
+        self.assertEqual(fs.read('file2'), 'other text')
+
+        fs.create('file3')
+        self.assertEqual(fs.files_list['file3'].id, 1)
+
+    @staticmethod
+    def _format_legacy(file_name, size):
+        cluster_num = size // 4096
+        inode_map_offset = 20 + cluster_num * 4
+        inode_array_offset = inode_map_offset + cluster_num
+        inode_array_end = inode_array_offset + cluster_num * 28
+        first_cluster_offset = (inode_array_end // 4096 + 1) * 4096
+        free_cluster_num = cluster_num - first_cluster_offset // 4096
+
+        with open(file_name, 'wb') as file:
+            file.truncate(size)
+            file.write(pack('5i', cluster_num, free_cluster_num - 1,
+                            inode_map_offset, inode_array_offset,
+                            first_cluster_offset))
+            file.write(pack('%di' % cluster_num,
+                            *([-1] + [0] * (cluster_num - 1))))
+            file.write(pack('%d?' % cluster_num, *(
+                [False] + [True] * (free_cluster_num - 1) +
+                [False] * (cluster_num - free_cluster_num))))
+            file.write(Inode(0, size=4096, first_cluster=0).pack())
+            for id in range(1, cluster_num):
+                file.write(Inode(id).pack())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,63 +1,96 @@
+from array import array
 from struct import pack, unpack, calcsize
 from time import time, localtime, strftime
 
 
 class Inode(object):
+    __slots__ = ('_table', '_row', '_id', '__weakref__')
     format = '7i'
     _size = calcsize(format)
 
     def __init__(self, id, uid=0, perm=0, size=0, ctime=0, mtime=0,
                  first_cluster=-1):
         self._id = id
-        self._uid = uid
-        self._perm = perm
-        self._size = size
-        self._ctime = ctime
-        self._mtime = mtime
-        self._first_cluster = first_cluster
+        self._table = None
+        self._row = array('i', (uid, perm, size, ctime, mtime,
+                                first_cluster))
 
     def pack(self):
-        return pack(self.format, self._id, self._uid, self._perm, self._size,
-                    self._ctime, self._mtime, self._first_cluster)
+        return pack(self.format, self._id, *self._values())
+
+    def copy(self):
+        return Inode(self._id, *self._values())
 
     def set_permissions(self, owner_read, owner_write, other_read,
                         other_write):
-        self._perm = 0
+        perm = self._get('perm') // 100 * 100
         if owner_read:
-            self._perm += 20
+            perm += 20
         if owner_write:
-            self._perm += 10
+            perm += 10
         if other_read:
-            self._perm += 2
+            perm += 2
         if other_write:
-            self._perm += 1
+            perm += 1
+        self._set('perm', perm)
+
+    def set_directory(self):
+        self._set('perm', 200 + self._get('perm') % 100)
 
     def set_mtime(self):
-        self._mtime = int(time())
+        self._set('mtime', int(time()))
+
+    def _get(self, column):
+        if self._table is None:
+            return self._row[InodeTable.index[column]]
+        return getattr(self._table, column)[self._row]
+
+    def _set(self, column, value):
+        if self._table is None:
+            self._row[InodeTable.index[column]] = value
+        else:
+            getattr(self._table, column)[self._row] = value
+
+    def _values(self):
+        if self._table is None:
+            return tuple(self._row)
+        return self._table.get_row(self._row)
+
+    def _assign(self, values):
+        if self._table is None:
+            self._row[:] = array('i', values)
+        else:
+            self._table.set_row(self._row, *values)
 
     @property
     def ctime(self):
-        return strftime('%d %b %H:%M:%S', localtime(self._ctime))
+        return strftime('%d %b %H:%M:%S',
+                        localtime(self._get('ctime')))
 
     @property
     def mtime(self):
-        return strftime('%d %b %H:%M:%S', localtime(self._mtime))
+        return strftime('%d %b %H:%M:%S',
+                        localtime(self._get('mtime')))
+
+    @property
+    def directory(self):
+        return self._get('perm') // 100 == 2
 
     @property
     def owner_read(self):
-        return self._perm // 10 >= 2
+        return self._get('perm') % 100 // 10 >= 2
 
     @property
     def owner_write(self):
-        return (self._perm // 10) % 2 == 1
+        return (self._get('perm') // 10) % 2 == 1
 
     @property
     def other_read(self):
-        return self._perm % 10 >= 2
+        return self._get('perm') % 10 >= 2
 
     @property
     def other_write(self):
-        return (self._perm % 10) % 2 == 1
+        return (self._get('perm') % 10) % 2 == 1
 
     @property
     def id(self):
@@ -65,30 +98,107 @@ class Inode(object):
 
     @property
     def uid(self):
-        return self._uid
+        return self._get('uid')
 
     @uid.setter
     def uid(self, uid):
-        self._uid = uid
+        self._set('uid', uid)
 
     @property
     def first_cluster(self):
-        return self._first_cluster
+        return self._get('first_cluster')
 
     @property
     def size(self):
-        return self._size
+        return self._get('size')
 
     @size.setter
     def size(self, size):
-        self._size = size
+        self._set('size', size)
 
     @staticmethod
-    def get_inode(inode_array_offset, file, index):
-        file.seek(inode_array_offset + Inode._size * index)
-        return Inode(*unpack(Inode.format, file.read(Inode._size)))
+    def view(table, id):
+        inode = Inode.__new__(Inode)
+        inode._table = table
+        inode._row = id
+        inode._id = id
+        return inode
+
+    @staticmethod
+    def get_inode(inode_array_offset, backend, index):
+        return Inode(*unpack(Inode.format, backend.read(
+            inode_array_offset + Inode._size * index, Inode._size)))
+
+    @staticmethod
+    def set_inode(inode_array_offset, backend, inode):
+        backend.write(inode_array_offset + Inode._size * inode.id,
+                      inode.pack())
+
+
+class InodeTable(object):
+    __slots__ = ('uid', 'perm', 'size', 'ctime', 'mtime', 'first_cluster',
+                 '_loaded')
+    _columns = __slots__[:-1]
+    index = {column: number for number, column in enumerate(_columns)}
+
+    def __init__(self, size):
+        for column in self._columns:
+            setattr(self, column, array('i', [0]) * size)
+        self._loaded = bytearray(size)
+
+    def __len__(self):
+        return len(self._loaded)
+
+    def get(self, id):
+        if not self._loaded[id]:
+            return None
+        return Inode.view(self, id)
+
+    def put(self, inode):
+        if inode._table is not self:
+            self.set_row(inode.id, *inode._values())
+
+    def get_row(self, row):
+        return tuple(getattr(self, column)[row] for column in self._columns)
+
+    def set_row(self, row, *values):
+        for column, value in zip(self._columns, values):
+            getattr(self, column)[row] = value
+        self._loaded[row] = 1
+
+    def loaded(self, row):
+        return self._loaded[row] == 1
 
     @staticmethod
-    def set_inode(inode_array_offset, file, inode):
-        file.seek(inode_array_offset + Inode._size * inode.id)
-        file.write(inode.pack())
+    def empty(size):
+        table = InodeTable(size)
+        table.first_cluster = array('i', [-1]) * size
+        table._loaded = bytearray(b'\x01' * size)
+        return table
+
+    def read_row(self, inode_array_offset, backend, row):
+        self.set_row(row, *unpack(Inode.format, backend.read(
+            inode_array_offset + Inode._size * row, Inode._size))[1:])
+        return self.get(row)
+
+    def read(self, inode_array_offset, backend, count):
+        fields = len(self._columns) + 1
+        records = array('i', [0]) * (count * fields)
+        backend.readinto(inode_array_offset, records)
+
+        for index, column in enumerate(self._columns, 1):
+            getattr(self, column)[:count] = records[index::fields]
+        self._loaded[:count] = b'\x01' * count
+
+    def write(self, inode_array_offset, backend, count):
+        fields = len(self._columns) + 1
+        records = array('i', [0]) * (count * fields)
+        records[::fields] = array('i', range(count))
+
+        for index, column in enumerate(self._columns, 1):
+            records[index::fields] = getattr(self, column)[:count]
+        backend.write(inode_array_offset, records)
+
+    def find(self, column, value, rows):
+        column = getattr(self, column)
+        return [row for row in rows if column[row] == value]
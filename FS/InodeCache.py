@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+from weakref import WeakValueDictionary
+from FS.Inode import Inode
+
+
+class InodeCache(object):
+    def __init__(self, superblock, backend, capacity=1024):
+        self._inode_array_offset = superblock.inode_array_offset
+        self._backend = backend
+        self._capacity = capacity
+
+        self._recent = OrderedDict()
+        self._live = WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._recent)
+
+    def get(self, id):
+        with self._lock:
+            inode = self._live.get(id)
+            if inode is not None:
+                self._touch(inode)
+            return inode
+
+    def put(self, inode):
+        with self._lock:
+            existing = self._live.get(inode.id)
+            if existing is None:
+                existing = self._live[inode.id] = inode
+            elif existing is not inode:
+                existing._assign(inode._values())
+            self._touch(existing)
+            return existing
+
+    def loaded(self, row):
+        return self._live.get(row) is not None
+
+    def read_row(self, inode_array_offset, backend, row):
+        return self.put(Inode.get_inode(inode_array_offset, backend, row))
+
+    def find(self, column, value, rows):
+        found = []
+        for row in rows:
+            inode = self.get(row)
+            if inode is None:
+                inode = self.read_row(self._inode_array_offset,
+                                      self._backend, row)
+            if getattr(inode, column) == value:
+                found.append(row)
+        return found
+
+    def _touch(self, inode):
+        recent = self._recent
+        recent[inode.id] = inode
+        recent.move_to_end(inode.id)
+        while len(recent) > self._capacity:
+            recent.popitem(last=False)
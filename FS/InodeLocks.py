@@ -0,0 +1,15 @@
+import threading
+from FS.ReadWriteLock import ReadWriteLock
+
+
+class InodeLocks(object):
+    def __init__(self):
+        self._locks = {}
+        self._mutex = threading.Lock()
+
+    def get(self, inode_id):
+        with self._mutex:
+            lock = self._locks.get(inode_id)
+            if lock is None:
+                lock = self._locks[inode_id] = ReadWriteLock()
+            return lock
@@ -1,26 +1,73 @@
-from struct import pack, unpack, calcsize
+from FS.DirtyPages import DirtyPages
 
 
 class InodeMap(object):
-    def __init__(self, list):
-        self._list = list
+    _non_zero = bytes([0] + [1] * 255)
+
+    def __init__(self, bits):
+        self._bits = bits
+        self._free_bytes = bits.translate(self._non_zero)
+        self._dirty = DirtyPages()
 
     def set(self, index, value):
-        self._list[index] = value
+        byte_index = index >> 3
+        mask = 1 << (index & 7)
+
+        if value:
+            byte = self._bits[byte_index] | mask
+        else:
+            byte = self._bits[byte_index] & ~mask
+
+        self._bits[byte_index] = byte
+        self._free_bytes[byte_index] = byte != 0
+        self._dirty.mark(byte_index)
+
+    def write(self, inode_map_offset, backend):
+        self._dirty.write(self._bits, inode_map_offset, backend)
 
-    def write(self, inode_map_offset, file):
-        file.seek(inode_map_offset)
-        file.write(pack('%d?' % len(self._list), *self._list))
+    def mark_dirty(self):
+        self._dirty.mark_all(len(self._bits))
+
+    @property
+    def dirty(self):
+        return len(self._dirty) > 0
 
     def get_free_inode(self):
-        return self._list.index(True)
+        byte_index = self._free_bytes.find(1)
+        if byte_index == -1:
+            raise ValueError('Не осталось свободных индексных дескрипторов')
+
+        byte = self._bits[byte_index]
+        return byte_index * 8 + (byte & -byte).bit_length() - 1
+
+    @staticmethod
+    def size(inode_num):
+        return (inode_num + 7) // 8
 
     @staticmethod
     def empty(size):
-        return InodeMap([True] * size)
+        bits = bytearray(b'\xff' * (size // 8))
+        if size % 8:
+            bits.append((1 << size % 8) - 1)
+
+        inode_map = InodeMap(bits)
+        inode_map.mark_dirty()
+        return inode_map
+
+    @staticmethod
+    def read(inode_num, inode_map_offset, backend):
+        return InodeMap(bytearray(
+            backend.read(inode_map_offset, InodeMap.size(inode_num))))
 
     @staticmethod
-    def read(inode_num, inode_map_offset, file):
-        format = '%d?' % inode_num
-        file.seek(inode_map_offset)
-        return InodeMap(list(unpack(format, file.read(calcsize(format)))))
+    def read_legacy(inode_num, inode_map_offset, backend):
+        flags = bytes(backend.read(inode_map_offset, inode_num))
+
+        size = InodeMap.size(inode_num)
+        bits = 0
+        for bit in range(8):
+            bits |= int.from_bytes(flags[bit::8], 'little') << bit
+
+        inode_map = InodeMap(bytearray(bits.to_bytes(size, 'little')))
+        inode_map.mark_dirty()
+        return inode_map
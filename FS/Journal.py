@@ -0,0 +1,264 @@
+import threading
+from struct import pack, unpack_from, calcsize
+from zlib import crc32
+from FS.Exceptions import JournalOverflowException
+
+
+class Journal(object):
+    _magic = 0x4c4e524a
+    _header_format = '3iI'
+    _header_size = calcsize(_header_format)
+    _record_format = '2i'
+    _record_size = calcsize(_record_format)
+    _empty = -1
+    _page_size = 4096
+
+    def __init__(self, superblock, backend, log_backend):
+        self._backend = backend
+        self._log_backend = log_backend
+        self._offset = superblock.journal_offset
+        self._size = superblock.journal_cluster_num * superblock.cluster_size
+
+        self._records = []
+        self._pages = {}
+        self._logged = set()
+        self._pending_size = 0
+        self._position = 0
+        self._sequence = 0
+        self._lock = threading.RLock()
+
+    def read(self, offset, size):
+        buffer = bytearray(size)
+        del (buffer[self.readinto(offset, buffer):])
+        return buffer
+
+    def readinto(self, offset, buffer):
+        buffer = memoryview(buffer).cast('B')
+        if not self._pages or not len(buffer):
+            return self._backend.readinto(offset, buffer)
+
+        with self._lock:
+            size = self._backend.readinto(offset, buffer)
+
+            numbers = set()
+            for page in self._page_range(offset, len(buffer)):
+                numbers.update(self._pages.get(page, ()))
+
+            end = offset + len(buffer)
+            for number in sorted(numbers):
+                if self._records[number] is None:
+                    continue
+                record_offset, record_size, data = self._records[number]
+                start = max(offset, record_offset)
+                stop = min(end, record_offset + record_size)
+                if start < stop:
+                    buffer[start - offset:stop - offset] = \
+                        data[start - record_offset:stop - record_offset]
+            return size
+
+    def write(self, offset, data):
+        with self._lock:
+            data = bytes(data)
+            if not data:
+                return
+
+            number = len(self._records)
+            self._records.append((offset, len(data), data))
+            for page in self._page_range(offset, len(data)):
+                self._pages.setdefault(page, []).append(number)
+            self._pending_size += self._record_size + len(data)
+
+    def revoke(self, offset, size):
+        with self._lock:
+            pages = self._page_range(offset, size)
+            if not any(page in self._pages or page in self._logged
+                       for page in pages):
+                return
+
+            records = self._records
+            for page in self._page_range(offset, size):
+                for number in self._pages.get(page, ()):
+                    if (records[number] is not None and
+                            self._overlaps(records[number], offset, size)):
+                        records[number] = None
+
+            records.append((offset, size, None))
+            self._pending_size += self._record_size
+
+    def discard(self):
+        with self._lock:
+            self._records = []
+            self._pages = {}
+            self._pending_size = 0
+
+    def commit(self, atomic=False):
+        with self._lock:
+            if not self._records:
+                return
+
+            payload = self._pack_records()
+            transaction = pack(self._header_format, self._magic,
+                               self._sequence, len(payload),
+                               crc32(payload)) + payload
+
+            if len(transaction) > self._size:
+                if atomic:
+                    raise JournalOverflowException(
+                        'Изменения не помещаются в журнал')
+                self._apply(self._records)
+                self.discard()
+                self.checkpoint()
+                return
+
+            if self._position + len(transaction) > self._size:
+                self.checkpoint()
+
+            self._log_backend.write(self._offset + self._position,
+                                    transaction)
+            self._log_backend.sync()
+
+            for record in self._records:
+                if record is not None and record[2] is not None:
+                    self._logged.update(self._page_range(record[0],
+                                                         record[1]))
+            self._apply(self._records)
+            self.discard()
+            self._position += len(transaction)
+            self._sequence += 1
+
+    def checkpoint(self):
+        with self._lock:
+            self._backend.sync()
+            if self._size and self._position:
+                self._log_backend.write(self._offset, pack(
+                    self._header_format, self._magic, self._sequence,
+                    self._empty, 0))
+                self._log_backend.sync()
+            self._position = 0
+            self._logged.clear()
+
+    def replay(self):
+        if not self._size:
+            return False
+
+        log = bytes(self._log_backend.read(self._offset, self._size))
+        magic, sequence, length, checksum = unpack_from(self._header_format,
+                                                        log)
+        if magic != self._magic:
+            return False
+
+        self._sequence = sequence
+        if length == self._empty:
+            return False
+
+        records = []
+        position = 0
+        while position + self._header_size <= self._size:
+            magic, sequence, length, checksum = unpack_from(
+                self._header_format, log, position)
+            start = position + self._header_size
+            payload = log[start:start + length]
+            if (magic != self._magic or sequence != self._sequence or
+                    length < 0 or len(payload) != length or
+                    crc32(payload) != checksum):
+                break
+
+            records.extend(self._unpack_records(payload))
+            position = start + length
+            self._sequence += 1
+
+        self._apply(self._revoked(records))
+        self._position = position
+        self.checkpoint()
+        return True
+
+    def _pack_records(self):
+        chunks = []
+        for record in self._records:
+            if record is None:
+                continue
+            offset, size, data = record
+            if data is None:
+                chunks.append(pack(self._record_format, offset, -size))
+            else:
+                chunks.append(pack(self._record_format, offset, size))
+                chunks.append(data)
+        return b''.join(chunks)
+
+    def _unpack_records(self, payload):
+        records = []
+        position = 0
+        while position < len(payload):
+            offset, size = unpack_from(self._record_format, payload,
+                                       position)
+            position += self._record_size
+            if size < 0:
+                records.append((offset, -size, None))
+            else:
+                records.append((offset, size,
+                                payload[position:position + size]))
+                position += size
+        return records
+
+    @staticmethod
+    def _overlaps(record, offset, size):
+        return record[0] < offset + size and offset < record[0] + record[1]
+
+    @staticmethod
+    def _revoked(records):
+        revoked = []
+        kept = []
+        for record in reversed(records):
+            if record[2] is None:
+                revoked.append(record)
+            elif not any(Journal._overlaps(record, offset, size)
+                         for offset, size, data in revoked):
+                kept.append(record)
+        kept.reverse()
+        return kept
+
+    def _apply(self, records):
+        order = sorted((record[0], number) for number, record in
+                       enumerate(records) if record is not None and
+                       record[2] is not None)
+
+        group = []
+        end = 0
+        for offset, number in order:
+            if group and offset > end + self._page_size:
+                self._write_group(records, group, end)
+                group = []
+            if not group:
+                end = offset
+            group.append(number)
+            end = max(end, offset + records[number][1])
+        if group:
+            self._write_group(records, group, end)
+
+    def _write_group(self, records, group, end):
+        start = records[group[0]][0]
+        buffer = bytearray(end - start)
+
+        covered = start
+        for number in group:
+            if records[number][0] > covered:
+                self._backend.readinto(start, buffer)
+                break
+            covered = max(covered, records[number][0] + records[number][1])
+
+        for number in sorted(group):
+            offset, size, data = records[number]
+            buffer[offset - start:offset - start + size] = data
+        self._backend.write(start, buffer)
+
+    def _page_range(self, offset, size):
+        return range(offset // self._page_size,
+                     (offset + size - 1) // self._page_size + 1)
+
+    @property
+    def pending_size(self):
+        return self._pending_size
+
+    @property
+    def size(self):
+        return self._size
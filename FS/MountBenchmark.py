@@ -0,0 +1,124 @@
+import io
+import os
+import sys
+from struct import unpack, calcsize
+from time import perf_counter
+from FS.Backend import FileBackend
+from FS.Exceptions import NoFreeClustersException
+from FS.FileSystem import FileSystem
+from FS.Inode import Inode
+from FS.InodeMap import InodeMap
+from FS.SuperBlock import SuperBlock
+
+
+class CountingBackend(FileBackend):
+    reads = 0
+
+    def read(self, offset, size):
+        CountingBackend.reads += 1
+        return super().read(offset, size)
+
+    def readinto(self, offset, buffer):
+        CountingBackend.reads += 1
+        return super().readinto(offset, buffer)
+
+
+class CountingFile(io.FileIO):
+    reads = 0
+
+    def readinto(self, buffer):
+        CountingFile.reads += 1
+        return super().readinto(buffer)
+
+
+def legacy_clusters_chain(fat, first_cluster):
+    chain = [first_cluster]
+    while fat[chain[-1]] != -1:
+        chain.append(fat[chain[-1]])
+    return chain
+
+
+def legacy_mount(file_name):
+    backend = FileBackend(file_name)
+    superblock = SuperBlock.read(backend)
+    backend.close()
+
+    file = io.BufferedRandom(CountingFile(file_name, 'rb+'))
+
+    format = '%di' % superblock.cluster_num
+    file.seek(superblock.fat_offset)
+    fat = list(unpack(format, file.read(calcsize(format))))
+
+    format = '%d?' % InodeMap.size(superblock.cluster_num)
+    file.seek(superblock.inode_map_offset)
+    inode_map = list(unpack(format, file.read(calcsize(format))))
+
+    files_list = {}
+    inode_size = calcsize(Inode.format)
+    for cluster in legacy_clusters_chain(fat, 0):
+        file.seek(superblock.first_cluster_offset +
+                  cluster * superblock.cluster_size)
+        for _ in range(superblock.cluster_size // 64):
+            data = unpack('59sci', file.read(64))
+            length = ord(data[1])
+            if length:
+                position = file.tell()
+                file.seek(superblock.inode_array_offset +
+                          inode_size * data[2])
+                files_list[data[0][:length].decode()] = Inode(
+                    *unpack(Inode.format, file.read(inode_size)))
+                file.seek(position)
+
+    file.close()
+    return fat, inode_map, files_list
+
+
+def mount(file_name):
+    fs = FileSystem(file_name, backend=CountingBackend)
+    fs._backend.close()
+    return fs
+
+
+def measure(function, file_name, counter, number):
+    times = []
+    reads = 0
+    for _ in range(number):
+        counter.reads = 0
+        start = perf_counter()
+        function(file_name)
+        times.append(perf_counter() - start)
+        reads = counter.reads
+    return min(times), reads
+
+
+def fill(file_name):
+    FileSystem.format(file_name)
+    file_num = 0
+    with FileSystem(file_name, group_commit=1000) as fs:
+        while True:
+            try:
+                fs.create(str(file_num))
+            except NoFreeClustersException:
+                break
+            file_num += 1
+    with FileSystem(file_name) as fs:
+        return len(fs.files_list)
+
+
+def run(file_name='benchmark', number=5):
+    file_num = fill(file_name)
+
+    legacy, legacy_reads = measure(legacy_mount, file_name, CountingFile,
+                                   number)
+    bulk, bulk_reads = measure(mount, file_name, CountingBackend, number)
+    os.remove(file_name)
+
+    print('Файлов: %d' % file_num)
+    print('Поэлементное монтирование: %.4f с, %d чтений' %
+          (legacy, legacy_reads))
+    print('Пакетное монтирование: %.4f с, %d чтений' % (bulk, bulk_reads))
+    print('Ускорение: %.1f раз' % (legacy / bulk))
+
+
+if __name__ == '__main__':
+    run(*sys.argv[1:2])
@@ -0,0 +1,159 @@
+from collections.abc import Mapping
+from struct import Struct, unpack
+from FS.Exceptions import NoFreeClustersException, JournalOverflowException
+from FS.Inode import Inode
+
+
+class Protocol(object):
+    operations = ('create', 'mkdir', 'rmdir', 'listdir', 'read',
+                  'read_bytes', 'write', 'write_bytes', 'append',
+                  'append_bytes', 'pwrite', 'truncate', 'copy', 'delete',
+                  'rename', 'set_permissions', 'set_owner', 'add_user',
+                  'del_user', 'users', 'logins', 'commit', 'sync', 'login')
+    ok = 0
+    error = 1
+    max_length = 64 * 1024 * 1024
+
+    _header = Struct('!IIB')
+    _integer = Struct('!q')
+    _length = Struct('!I')
+    _errors = {error.__name__: error for error in (
+        FileNotFoundError, FileExistsError, PermissionError,
+        IsADirectoryError, NotADirectoryError, ValueError, OSError,
+        RuntimeError, NoFreeClustersException, JournalOverflowException)}
+
+    @staticmethod
+    def frame(request_id, code, value):
+        payload = bytearray()
+        Protocol._encode(value, payload)
+        return Protocol._header.pack(len(payload), request_id,
+                                     code) + payload
+
+    @staticmethod
+    def frames(buffer):
+        header_size = Protocol._header.size
+        frames = []
+        position = 0
+        while position + header_size <= len(buffer):
+            length, request_id, code = Protocol._header.unpack_from(
+                buffer, position)
+            if length > Protocol.max_length:
+                raise ValueError('Слишком большой пакет')
+
+            end = position + header_size + length
+            if end > len(buffer):
+                break
+            frames.append((request_id, code,
+                           bytes(buffer[position + header_size:end])))
+            position = end
+        del (buffer[:position])
+        return frames
+
+    @staticmethod
+    def decode(payload):
+        try:
+            value, position = Protocol._decode(payload, 0)
+        except (TypeError, RecursionError, UnicodeDecodeError) as error:
+            raise ValueError('Повреждённый пакет') from error
+
+        if position != len(payload):
+            raise ValueError('Повреждённый пакет')
+        return value
+
+    @staticmethod
+    def pack_error(error):
+        return type(error).__name__, str(error)
+
+    @staticmethod
+    def unpack_error(error):
+        name, message = error
+        return Protocol._errors.get(name, OSError)(message)
+
+    @staticmethod
+    def _encode(value, payload):
+        if value is None:
+            payload += b'N'
+        elif value is True:
+            payload += b'T'
+        elif value is False:
+            payload += b'F'
+        elif isinstance(value, int):
+            payload += b'i'
+            payload += Protocol._integer.pack(value)
+        elif isinstance(value, str):
+            data = value.encode()
+            payload += b's'
+            payload += Protocol._length.pack(len(data))
+            payload += data
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            data = memoryview(value).cast('B')
+            payload += b'b'
+            payload += Protocol._length.pack(len(data))
+            payload += data
+        elif isinstance(value, Inode):
+            payload += b'I'
+            payload += value.pack()
+        elif isinstance(value, Mapping):
+            payload += b'd'
+            payload += Protocol._length.pack(len(value))
+            for key, item in value.items():
+                Protocol._encode(key, payload)
+                Protocol._encode(item, payload)
+        elif isinstance(value, (tuple, list)):
+            payload += b't' if isinstance(value, tuple) else b'l'
+            payload += Protocol._length.pack(len(value))
+            for item in value:
+                Protocol._encode(item, payload)
+        else:
+            raise TypeError('Неподдерживаемый тип данных')
+
+    @staticmethod
+    def _decode(buffer, position):
+        tag = buffer[position:position + 1]
+        position += 1
+        if not tag:
+            raise ValueError('Повреждённый пакет')
+        if tag == b'N':
+            return None, position
+        if tag == b'T':
+            return True, position
+        if tag == b'F':
+            return False, position
+        if tag == b'i':
+            Protocol._check(buffer, position, Protocol._integer.size)
+            return (Protocol._integer.unpack_from(buffer, position)[0],
+                    position + Protocol._integer.size)
+        if tag == b'I':
+            Protocol._check(buffer, position, Inode._size)
+            end = position + Inode._size
+            return Inode(*unpack(Inode.format, buffer[position:end])), end
+
+        Protocol._check(buffer, position, Protocol._length.size)
+        length, = Protocol._length.unpack_from(buffer, position)
+        position += Protocol._length.size
+        if tag == b's':
+            Protocol._check(buffer, position, length)
+            end = position + length
+            return bytes(buffer[position:end]).decode(), end
+        if tag == b'b':
+            Protocol._check(buffer, position, length)
+            end = position + length
+            return bytes(buffer[position:end]), end
+        if tag == b'd':
+            value = {}
+            for _ in range(length):
+                key, position = Protocol._decode(buffer, position)
+                value[key], position = Protocol._decode(buffer, position)
+            return value, position
+        if tag in (b't', b'l'):
+            value = []
+            for _ in range(length):
+                item, position = Protocol._decode(buffer, position)
+                value.append(item)
+            return (tuple(value) if tag == b't' else value), position
+        raise ValueError('Повреждённый пакет')
+
+    @staticmethod
+    def _check(buffer, position, size):
+        if position + size > len(buffer):
+            raise ValueError('Повреждённый пакет')
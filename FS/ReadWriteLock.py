@@ -0,0 +1,77 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock(object):
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = {}
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer != me and me not in self._readers:
+                while self._writer is not None or self._waiting_writers:
+                    self._condition.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._readers[me] == 1:
+                del (self._readers[me])
+                if not self._readers:
+                    self._condition.notify_all()
+            else:
+                self._readers[me] -= 1
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+
+            if me in self._readers:
+                raise RuntimeError('Нельзя повысить блокировку чтения')
+
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        with self._condition:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._condition.notify_all()
+
+    @property
+    def read_owned(self):
+        return threading.get_ident() in self._readers
+
+    @property
+    def write_owned(self):
+        return self._writer == threading.get_ident()
+
+    @contextmanager
+    def reading(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def writing(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
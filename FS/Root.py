@@ -1,120 +1,197 @@
-from struct import pack, unpack
+from collections.abc import Mapping
 from time import time
-from FS.Inode import Inode
+from FS.Directory import Directory
+from FS.Inode import Inode, InodeTable
+from FS.InodeCache import InodeCache
 
 
 class Root(object):
-    def __init__(self, superblock, fat, file):
+    def __init__(self, superblock, fat, backend, lazy_inodes=False,
+                 inode_cache_size=1024):
         self._superblock = superblock
         self._fat = fat
-        self._file = file
-
-        self._init_files_list()
-
-    def add(self, file_name, inode):
-        superblock = self._superblock
-        fat = self._fat
-        file = self._file
-
-        file_name = bytes(file_name, 'utf-8')
-
-        clusters = fat.get_clusters_chain(0)
-        empty_space = None
-
-        for cluster in clusters:
-            file.seek(self._cluster_offset(cluster))
-            for _ in range(superblock.cluster_size // 64):
-                data = unpack('59sci', file.read(64))
-                if ord(data[1]) == 0:
-                    empty_space = file.tell() - 64
-                    break
-
-            if empty_space:
-                break
+        self._backend = backend
+        if lazy_inodes:
+            self._inodes = InodeCache(superblock, backend, inode_cache_size)
         else:
-            cluster_index = fat.get_free_cluster()
-
-            fat.set(clusters[-1], cluster_index)
-            fat.set(cluster_index, -1)
-            empty_space = self._cluster_offset(cluster_index)
+            self._inodes = InodeTable(superblock.cluster_num)
+        self._directories = {}
 
-            root_inode = Inode.get_inode(superblock.inode_array_offset, file,
-                                         0)
-            root_inode.size = (len(clusters) + 1) * superblock.cluster_size
-            Inode.set_inode(superblock.inode_array_offset, file, root_inode)
+        self._init_files_list(lazy_inodes)
 
-        file.seek(empty_space)
-        file.write(pack('59sci', file_name, bytes([len(file_name)]), inode.id))
+    def add(self, path, inode):
+        directory, name = self._parent(path)
+        directory.add(name, inode.id)
 
-        self._list[file_name.decode()] = inode
-        Inode.set_inode(superblock.inode_array_offset, file, inode)
+        self._inodes.put(inode)
+        Inode.set_inode(self._superblock.inode_array_offset, self._backend,
+                        inode)
 
-    def read(self, file_name):
-        return self._list[file_name]
-
-    def delete(self, file_name):
-        superblock = self._superblock
-        fat = self._fat
-        file = self._file
-
-        file_name = bytes(file_name, 'utf-8')
-
-        clusters = fat.get_clusters_chain(0)
-        found = False
-        for cluster in clusters:
-            file.seek(self._cluster_offset(cluster))
-            for _ in range(superblock.cluster_size // 64):
-                data = unpack('59sci', file.read(64))
-                length = ord(data[1])
-                name = data[0][:length]
-                if name == file_name:
-                    file.seek(-64, 1)
-                    file.write(pack('64s', bytes([0] * 64)))
-                    del (self._list[file_name.decode()])
-                    found = True
-                    break
-
-            if found:
-                break
-
-    def _init_files_list(self):
+    def mkdir(self, path, inode):
         superblock = self._superblock
-        fat = self._fat
-        file = self._file
 
-        self._list = {}
-        clusters = fat.get_clusters_chain(0)
-
-        for cluster in clusters:
-            file.seek(self._cluster_offset(cluster))
-            for _ in range(superblock.cluster_size // 64):
-                data = unpack('59sci', file.read(64))
-                length = ord(data[1])
-
-                if length:
-                    position = file.tell()
-                    self._list[data[0][:length].decode()] = Inode.get_inode(
-                            superblock.inode_array_offset, file, data[2])
-                    file.seek(position)
+        self._backend.write(self._cluster_offset(inode.first_cluster),
+                            bytes(superblock.cluster_size))
+        inode.size = superblock.cluster_size
+        inode.set_directory()
+        self.add(path, inode)
+
+    def read(self, path):
+        return self._resolve(self.split(path))
+
+    def get(self, path, default=None):
+        try:
+            return self.read(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return default
+
+    def listdir(self, path):
+        inode = self.read(path)
+        if not inode.directory:
+            raise NotADirectoryError('Не является каталогом')
+        return FilesView(self, self._directory(inode))
+
+    def find_by_uid(self, uid, path=''):
+        inodes = self._inodes
+        directory = self._directory(self.read(path))
+
+        ids = {}
+        for name, inode_id in directory.items():
+            ids[inode_id] = name
+            if not inodes.loaded(inode_id):
+                self._get_inode(inode_id)
+
+        found = [path + ids[inode_id] for inode_id in
+                 inodes.find('uid', uid, ids)]
+        for inode_id, name in ids.items():
+            if self._get_inode(inode_id).directory:
+                found.extend(self.find_by_uid(uid, path + name + '/'))
+        return found
+
+    def contains(self, path):
+        return self.get(path) is not None
+
+    def delete(self, path):
+        directory, name = self._parent(path)
+        self._directories.pop(directory.lookup(name), None)
+        directory.delete(name)
+
+    def rename(self, src, dst):
+        src_parts = self.split(src)
+        dst_parts = self.split(dst)
+
+        if (self.read(src).directory and
+                dst_parts[:len(src_parts)] == src_parts):
+            raise ValueError('Нельзя переместить каталог внутрь себя')
+
+        src_directory, src_name = self._parent(src)
+        dst_directory, dst_name = self._parent(dst)
+        dst_directory.add(dst_name, src_directory.lookup(src_name))
+        src_directory.delete(src_name)
+
+    def _parent(self, path):
+        parts = self.split(path)
+        if not parts:
+            raise FileExistsError('Файл с таким именем уже существует')
+
+        inode = self._resolve(parts[:-1])
+        if not inode.directory:
+            raise NotADirectoryError('Не является каталогом')
+        return self._directory(inode), parts[-1]
+
+    def _resolve(self, parts):
+        inode = self._get_inode(0)
+        for part in parts:
+            if not inode.directory:
+                raise NotADirectoryError('Не является каталогом')
+
+            inode_id = self._directory(inode).lookup(part)
+            if inode_id is None:
+                raise FileNotFoundError('Файл с таким именем отсутствует')
+            inode = self._get_inode(inode_id)
+        return inode
+
+    def _directory(self, inode):
+        directory = self._directories.get(inode.id)
+        if directory is None:
+            directory = Directory(self._superblock, self._fat, self._backend,
+                                  inode)
+            self._directories[inode.id] = directory
+        return directory
+
+    def _get_inode(self, inode_id):
+        inode = self._inodes.get(inode_id)
+        if inode is None:
+            inode = self._inodes.read_row(
+                self._superblock.inode_array_offset, self._backend, inode_id)
+        return inode
+
+    def _init_files_list(self, lazy_inodes):
+        root_inode = self._get_inode(0)
+        directory = self._directory(root_inode)
+
+        if not root_inode.directory:
+            directory.rehash()
+
+        if not lazy_inodes:
+            directory.load()
+            ids = [inode_id for name, inode_id in directory.items()]
+            if ids:
+                self._inodes.read(self._superblock.inode_array_offset,
+                                  self._backend, max(ids) + 1)
 
     def _cluster_offset(self, cluster_index):
         return (
             self._superblock.first_cluster_offset + cluster_index *
             self._superblock.cluster_size)
 
-    def update_inode(self, file_name, inode):
-        self._list[file_name] = inode
-        Inode.set_inode(self._superblock.inode_array_offset, self._file, inode)
+    def update_inode(self, path, inode):
+        self._inodes.put(inode)
+        Inode.set_inode(self._superblock.inode_array_offset, self._backend,
+                        inode)
 
     @property
     def list(self):
-        return self._list.copy()
+        return self.listdir('')
 
     @staticmethod
-    def write(superblock, fat, inode_map, file):
+    def split(path):
+        parts = []
+        for part in path.split('/'):
+            if part == '..':
+                if parts:
+                    parts.pop()
+            elif part and part != '.':
+                parts.append(part)
+        return parts
+
+    @staticmethod
+    def write(superblock, fat, inode_map, backend):
         now = int(time())
         inode = Inode(id=0, size=superblock.cluster_size, ctime=now, mtime=now,
                       first_cluster=0)
-        Inode.set_inode(superblock.inode_array_offset, file, inode)
+        inode.set_directory()
+        Inode.set_inode(superblock.inode_array_offset, backend, inode)
         inode_map.set(inode.id, False)
         fat.set(0, -1)
+
+
+class FilesView(Mapping):
+    def __init__(self, root, directory):
+        self._root = root
+        self._directory = directory
+
+    def __getitem__(self, file_name):
+        inode_id = self._directory.lookup(file_name)
+        if inode_id is None:
+            raise KeyError(file_name)
+        return self._root._get_inode(inode_id)
+
+    def __contains__(self, file_name):
+        return self._directory.lookup(file_name) is not None
+
+    def __iter__(self):
+        return iter(self._directory)
+
+    def __len__(self):
+        return len(self._directory)
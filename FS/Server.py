@@ -0,0 +1,145 @@
+import os
+import socket
+import stat
+import threading
+from FS.Protocol import Protocol
+
+
+class Server(object):
+    def __init__(self, file_system, path):
+        self._file_system = file_system
+        self._path = path
+        self._socket = None
+        self._bound = False
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.listen()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def listen(self):
+        if os.path.lexists(self._path):
+            self._remove_stale_socket()
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self._path)
+        self._bound = True
+        self._socket.listen()
+
+    def serve_forever(self):
+        if self._socket is None:
+            self.listen()
+
+        listener = self._socket
+        while True:
+            try:
+                connection, _ = listener.accept()
+            except OSError:
+                break
+
+            with self._lock:
+                self._connections.add(connection)
+            threading.Thread(target=self._serve, args=(connection,),
+                             daemon=True).start()
+
+    def close(self):
+        if self._socket is None:
+            return
+
+        with self._lock:
+            connections = list(self._connections)
+        for connection in [self._socket] + connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+        self._socket = None
+
+        if self._bound and self._is_socket():
+            os.unlink(self._path)
+        self._bound = False
+        self._file_system.sync()
+
+    def _serve(self, connection):
+        buffer = bytearray()
+        uid = None
+        try:
+            while True:
+                data = connection.recv(64 * 1024)
+                if not data:
+                    break
+
+                buffer += data
+                try:
+                    frames = Protocol.frames(buffer)
+                except ValueError as error:
+                    connection.sendall(Protocol.frame(
+                        0, Protocol.error, Protocol.pack_error(error)))
+                    break
+
+                responses = []
+                for frame in frames:
+                    uid, response = self._dispatch(uid, *frame)
+                    responses.append(response)
+                if responses:
+                    connection.sendall(b''.join(responses))
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._connections.discard(connection)
+            connection.close()
+
+    def _dispatch(self, uid, request_id, operation, payload):
+        try:
+            args = Protocol.decode(payload)
+            if (not isinstance(args, tuple) or
+                    operation >= len(Protocol.operations)):
+                raise ValueError('Повреждённый пакет')
+
+            name = Protocol.operations[operation]
+            if name == 'login':
+                uid = attribute = self._file_system.login(*args)
+            elif uid is None:
+                raise PermissionError('Требуется вход в систему')
+            elif name == 'users':
+                attribute = {login: (user_id, '') for login, (user_id, hash)
+                             in self._file_system.users.items()}
+            else:
+                attribute = getattr(self._file_system.as_user(uid), name)
+                if callable(attribute):
+                    attribute = attribute(*args)
+        except Exception as error:
+            return uid, Protocol.frame(request_id, Protocol.error,
+                                       Protocol.pack_error(error))
+
+        try:
+            return uid, Protocol.frame(request_id, Protocol.ok, attribute)
+        except Exception as error:
+            return uid, Protocol.frame(request_id, Protocol.error,
+                                       Protocol.pack_error(error))
+
+    def _remove_stale_socket(self):
+        if not self._is_socket():
+            raise FileExistsError('Путь занят и не является сокетом')
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self._path)
+        except OSError:
+            os.unlink(self._path)
+        else:
+            raise FileExistsError('Сервер уже запущен')
+        finally:
+            probe.close()
+
+    def _is_socket(self):
+        try:
+            return stat.S_ISSOCK(os.lstat(self._path).st_mode)
+        except FileNotFoundError:
+            return False
@@ -0,0 +1,50 @@
+from contextvars import ContextVar
+from FS.Protocol import Protocol
+
+current_session = ContextVar('current_session', default=None)
+
+
+class Session(object):
+    operations = frozenset(Protocol.operations + ('open', 'files_list'))
+
+    def __init__(self, file_system, uid):
+        self._file_system = file_system
+        self._uid = uid
+        self._tokens = []
+
+    def __enter__(self):
+        self._tokens.append(current_session.set(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        current_session.reset(self._tokens.pop())
+
+    def __getattr__(self, name):
+        if name not in self.operations:
+            raise AttributeError(name)
+
+        token = current_session.set(self)
+        try:
+            attribute = getattr(self._file_system, name)
+        finally:
+            current_session.reset(token)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            token = current_session.set(self)
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                current_session.reset(token)
+
+        return call
+
+    def uid_for(self, file_system):
+        if file_system is self._file_system:
+            return self._uid
+        return None
+
+    @property
+    def uid(self):
+        return self._uid
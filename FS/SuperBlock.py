@@ -1,47 +1,87 @@
-from struct import pack, unpack, calcsize
+from struct import pack, unpack, unpack_from, calcsize
+from FS.InodeMap import InodeMap
 
 
 class SuperBlock(object):
     _cluster_size = 4096
-    _format = '5i'
-    _fat_offset = calcsize(_format)
+    _magic = 0x534f7950
+    _version = 3
+    _format = '7i'
+    _legacy_format = '5i'
+    _journal_cluster_num = 64
 
     def __init__(self, cluster_num, free_cluster_num, inode_bitmap_offset,
-                 inode_array_offset, first_cluster_offset):
+                 inode_array_offset, first_cluster_offset, version=_version):
         self._cluster_num = cluster_num
         self._free_cluster_num = free_cluster_num
         self._inode_map_offset = inode_bitmap_offset
         self._inode_array_offset = inode_array_offset
         self._first_cluster_offset = first_cluster_offset
-
-    def write(self, file):
-        file.seek(0)
-        file.write(
-            pack(self._format, self._cluster_num, self._free_cluster_num,
-                 self._inode_map_offset, self._inode_array_offset,
-                 self._first_cluster_offset))
+        self._version_number = version
+        self._dirty = False
+
+    def write(self, backend):
+        if not self._dirty:
+            return
+
+        fields = (self._cluster_num, self._free_cluster_num,
+                  self._inode_map_offset, self._inode_array_offset,
+                  self._first_cluster_offset)
+        if self.legacy:
+            backend.write(0, pack(self._legacy_format, *fields))
+        else:
+            backend.write(0, pack(self._format, self._magic,
+                                  self._version_number, *fields))
+        self._dirty = False
+
+    def mark_dirty(self):
+        self._dirty = True
+
+    def upgrade(self, journal=True):
+        if self.legacy:
+            inode_map_offset = calcsize(self._format) + self._cluster_num * 4
+            if (inode_map_offset + InodeMap.size(self._cluster_num) >
+                    self._inode_array_offset):
+                raise ValueError('Недостаточно места для новой разметки')
+            self._inode_map_offset = inode_map_offset
+
+        self._version_number = self._version if journal else 2
+        self._dirty = True
 
     def increase_free_cluster_num(self):
         self._free_cluster_num += 1
+        self._dirty = True
 
     def decrease_free_cluster_num(self):
         self._free_cluster_num -= 1
+        self._dirty = True
 
     @staticmethod
     def default(size):
         cluster_num = size // SuperBlock._cluster_size
         free_cluster_num = 0
-        inode_bitmap_offset = SuperBlock._fat_offset + cluster_num * 4
-        inode_array_offset = inode_bitmap_offset + cluster_num
+        inode_bitmap_offset = calcsize(SuperBlock._format) + cluster_num * 4
+        inode_array_offset = inode_bitmap_offset + InodeMap.size(cluster_num)
         first_cluster_offset = 0
-        return SuperBlock(cluster_num, free_cluster_num, inode_bitmap_offset,
-                          inode_array_offset, first_cluster_offset)
+        superblock = SuperBlock(cluster_num, free_cluster_num,
+                                inode_bitmap_offset, inode_array_offset,
+                                first_cluster_offset)
+        superblock.mark_dirty()
+        return superblock
 
     @staticmethod
-    def read(file):
+    def read(backend):
         format = SuperBlock._format
-        file.seek(0)
-        return SuperBlock(*unpack(format, file.read(calcsize(format))))
+        data = backend.read(0, calcsize(format))
+
+        if unpack_from('i', data)[0] != SuperBlock._magic:
+            return SuperBlock(*unpack_from(SuperBlock._legacy_format, data),
+                              version=1)
+
+        magic, version, *fields = unpack(format, data)
+        if version > SuperBlock._version:
+            raise ValueError('Неподдерживаемая версия файловой системы')
+        return SuperBlock(*fields, version=version)
 
     @property
     def cluster_size(self):
@@ -51,6 +91,11 @@ class SuperBlock(object):
     def cluster_num(self):
         return self._cluster_num
 
+    @property
+    def data_cluster_num(self):
+        return self._cluster_num - self._first_cluster_offset // \
+            self._cluster_size
+
     @property
     def free_cluster_num(self):
         return self._free_cluster_num
@@ -58,10 +103,42 @@ class SuperBlock(object):
     @free_cluster_num.setter
     def free_cluster_num(self, free_cluster_num):
         self._free_cluster_num = free_cluster_num
+        self._dirty = True
 
     @property
     def fat_offset(self):
-        return self._fat_offset
+        if self.legacy:
+            return calcsize(self._legacy_format)
+        return calcsize(self._format)
+
+    @property
+    def journal_first_cluster(self):
+        data_cluster_num = self.data_cluster_num
+        return data_cluster_num - min(self._journal_cluster_num,
+                                      data_cluster_num // 16)
+
+    @property
+    def journal_cluster_num(self):
+        if self._version_number < 3:
+            return 0
+        return self.data_cluster_num - self.journal_first_cluster
+
+    @property
+    def journal_offset(self):
+        return (self._first_cluster_offset +
+                self.journal_first_cluster * self._cluster_size)
+
+    @property
+    def version(self):
+        return self._version_number
+
+    @property
+    def dirty(self):
+        return self._dirty
+
+    @property
+    def legacy(self):
+        return self._version_number < 2
 
     @property
     def inode_map_offset(self):
@@ -78,3 +155,4 @@ class SuperBlock(object):
     @first_cluster_offset.setter
     def first_cluster_offset(self, first_cluster_offset):
         self._first_cluster_offset = first_cluster_offset
+        self._dirty = True
@@ -1,36 +1,43 @@
+import argparse
 import os
+import posixpath
 import subprocess
 from getpass import getpass
 from time import sleep
 
-import bcrypt
 from pyfiglet import figlet_format
 from prettytable import PrettyTable
 from prompt_toolkit import prompt
 from prompt_toolkit.history import InMemoryHistory
 from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
 
+from FS.Client import Client
 from FS.FileSystem import FileSystem, NoFreeClustersException
+from FS.Server import Server
 
 
 class PyOS(object):
-    def __init__(self, file_name):
+    def __init__(self, file_name, socket_path=None):
         self._cls()
-        if not os.path.exists(file_name):
-            self._format_file(file_name)
-
-        self._fs = FileSystem(file_name)
-        self._file_name = file_name
+        if socket_path is not None:
+            self._fs = Client(socket_path)
+        else:
+            if not os.path.exists(file_name):
+                self._format_file(file_name)
+            self._fs = FileSystem(file_name)
+        self._session = None
+        self._cwd = '/'
 
         self._init_commands()
 
     def run(self):
-        self._login(self._fs.users)
+        self._login()
 
         history = InMemoryHistory()
 
         while True:
-            command = prompt('>', auto_suggest=AutoSuggestFromHistory(),
+            command = prompt(self._cwd + '>',
+                             auto_suggest=AutoSuggestFromHistory(),
                              history=history).split()
             if command:
                 try:
@@ -42,7 +49,8 @@ class PyOS(object):
         methods = [self._create, self._read, self._write, self._append,
                    self._copy, self._rename, self._delete, self._set_perm,
                    self._list, self._add_user, self._del_user, self._exit,
-                   self._help, self._set_owner]
+                   self._help, self._set_owner, self._mkdir, self._rmdir,
+                   self._cd, self._ls]
         self._commands = {method.__name__[1:]: method for method in methods}
 
     def _create(self, command):
@@ -52,8 +60,9 @@ class PyOS(object):
             return
 
         try:
-            self._fs.create(command[1])
-        except (FileExistsError, NoFreeClustersException, ValueError) as e:
+            self._session.create(self._path(command[1]))
+        except (FileExistsError, FileNotFoundError, NotADirectoryError,
+                NoFreeClustersException, ValueError) as e:
             print(e)
 
     def _read(self, command):
@@ -63,8 +72,8 @@ class PyOS(object):
             return
 
         try:
-            print(self._fs.read(command[1]))
-        except (FileNotFoundError, PermissionError) as e:
+            print(self._session.read(self._path(command[1])))
+        except (FileNotFoundError, PermissionError, IsADirectoryError) as e:
             print(e)
 
     def _write(self, command):
@@ -75,8 +84,9 @@ class PyOS(object):
 
         data = prompt('Введите текст:\n', multiline=True)
         try:
-            self._fs.write(command[1], data)
-        except (PermissionError, NoFreeClustersException) as e:
+            self._session.write(self._path(command[1]), data)
+        except (PermissionError, FileNotFoundError, NotADirectoryError,
+                IsADirectoryError, NoFreeClustersException) as e:
             print(e)
 
     def _append(self, command):
@@ -87,8 +97,9 @@ class PyOS(object):
 
         data = prompt('Введите текст:\n', multiline=True)
         try:
-            self._fs.append(command[1], data)
-        except (PermissionError, NoFreeClustersException) as e:
+            self._session.append(self._path(command[1]), data)
+        except (PermissionError, FileNotFoundError, NotADirectoryError,
+                IsADirectoryError, NoFreeClustersException) as e:
             print(e)
 
     def _copy(self, command):
@@ -98,8 +109,9 @@ class PyOS(object):
             return
 
         try:
-            self._fs.copy(command[1], command[2])
+            self._session.copy(self._path(command[1]), self._path(command[2]))
         except (FileNotFoundError, PermissionError, FileExistsError,
+                NotADirectoryError, IsADirectoryError,
                 NoFreeClustersException) as e:
             print(e)
 
@@ -110,8 +122,10 @@ class PyOS(object):
             return
 
         try:
-            self._fs.rename(command[1], command[2])
-        except (FileNotFoundError, PermissionError, FileExistsError) as e:
+            self._session.rename(self._path(command[1]),
+                                 self._path(command[2]))
+        except (FileNotFoundError, PermissionError, FileExistsError,
+                NotADirectoryError, ValueError) as e:
             print(e)
 
     def _delete(self, command):
@@ -121,8 +135,8 @@ class PyOS(object):
             return
 
         try:
-            self._fs.delete(command[1])
-        except (FileNotFoundError, PermissionError) as e:
+            self._session.delete(self._path(command[1]))
+        except (FileNotFoundError, PermissionError, IsADirectoryError) as e:
             print(e)
 
     def _set_perm(self, command):
@@ -135,7 +149,7 @@ class PyOS(object):
         try:
             permissions = (
                 perm[0] == 'r', perm[1] == 'w', perm[2] == 'r', perm[3] == 'w')
-            self._fs.set_permissions(command[1], *permissions)
+            self._session.set_permissions(self._path(command[1]), *permissions)
         except (FileNotFoundError, PermissionError) as e:
             print(e)
 
@@ -146,18 +160,24 @@ class PyOS(object):
             return
 
         try:
-            self._fs.set_owner(command[1], command[2])
+            self._session.set_owner(self._path(command[1]), command[2])
         except (FileNotFoundError, PermissionError, ValueError) as e:
             print(e)
 
     def _list(self, command):
         """Список файлов"""
-        if len(command) != 1:
+        if len(command) > 2:
             self._command_not_found()
             return
 
-        files_list = self._fs.files_list
-        users = {id: login for login, (id, hash) in self._fs.users.items()}
+        try:
+            files_list = self._session.listdir(self._path(
+                command[1] if len(command) == 2 else '.'))
+        except (FileNotFoundError, NotADirectoryError) as e:
+            print(e)
+            return
+
+        users = self._session.logins
         table = PrettyTable(['Название', 'Размер', 'Права доступа', 'Владелец',
                              'Дата и время создания',
                              'Дата и время изменения'], border=0,
@@ -165,6 +185,8 @@ class PyOS(object):
 
         for file_name in sorted(files_list):
             inode = files_list[file_name]
+            if inode.directory:
+                file_name += '/'
 
             size = inode.size
             if 1024 <= size < 1024 ** 2:
@@ -182,6 +204,63 @@ class PyOS(object):
 
         print(table)
 
+    def _ls(self, command):
+        """Список имён файлов каталога"""
+        if len(command) > 2:
+            self._command_not_found()
+            return
+
+        try:
+            files_list = self._session.listdir(self._path(
+                command[1] if len(command) == 2 else '.'))
+        except (FileNotFoundError, NotADirectoryError) as e:
+            print(e)
+            return
+
+        print('  '.join(file_name + '/' if files_list[file_name].directory
+                        else file_name for file_name in sorted(files_list)))
+
+    def _mkdir(self, command):
+        """Создать каталог"""
+        if len(command) != 2:
+            self._command_not_found()
+            return
+
+        try:
+            self._session.mkdir(self._path(command[1]))
+        except (FileExistsError, FileNotFoundError, NotADirectoryError,
+                NoFreeClustersException, ValueError) as e:
+            print(e)
+
+    def _rmdir(self, command):
+        """Удалить пустой каталог"""
+        if len(command) != 2:
+            self._command_not_found()
+            return
+
+        try:
+            self._session.rmdir(self._path(command[1]))
+        except OSError as e:
+            print(e)
+
+    def _cd(self, command):
+        """Сменить текущий каталог"""
+        if len(command) > 2:
+            self._command_not_found()
+            return
+
+        path = self._path(command[1] if len(command) == 2 else '/')
+        try:
+            self._session.listdir(path)
+        except (FileNotFoundError, NotADirectoryError) as e:
+            print(e)
+            return
+
+        self._cwd = path
+
+    def _path(self, path):
+        return posixpath.normpath(posixpath.join(self._cwd, path))
+
     def _add_user(self, command):
         """Добавить пользователя"""
         if len(command) != 2:
@@ -190,7 +269,7 @@ class PyOS(object):
 
         password = getpass('Пароль:')
         try:
-            self._fs.add_user(command[1], password)
+            self._session.add_user(command[1], password)
         except (ValueError, PermissionError) as e:
             print(e)
 
@@ -201,7 +280,7 @@ class PyOS(object):
             return
 
         try:
-            self._fs.del_user(command[1])
+            self._session.del_user(command[1])
         except (ValueError, PermissionError) as e:
             print(e)
 
@@ -211,6 +290,7 @@ class PyOS(object):
             self._command_not_found()
             return
 
+        self._fs.close()
         exit()
 
     def _help(self, command):
@@ -222,28 +302,25 @@ class PyOS(object):
         for name, command in sorted(self._commands.items()):
             print('{0} - {1}'.format(name, command.__doc__))
 
-    def _login(self, users):
+    def _login(self):
         login = input('login:')
-        while login not in users:
-            print('Неверное имя пользователя')
-            login = input('login:')
-
-        hashed = users[login][1]
-        
-        while not bcrypt.checkpw(getpass('password:').encode(),
-                                 hashed.encode()):
-            print('Неверный пароль')
+        while True:
+            try:
+                uid = self._fs.login(login, getpass('password:'))
+                break
+            except ValueError as e:
+                print(e)
+                login = input('login:')
+            except PermissionError as e:
+                print(e)
         self._cls()
-        uid = users[login][0]
 
         if login.lower() == 'neo':
             from matrix_curses import matrix_curses
 
             matrix_curses.run(3)
 
-        if uid != 0:
-            del self._fs
-            self._fs = FileSystem(self._file_name, uid)
+        self._session = self._fs.as_user(uid)
 
         if login.lower() != 'neo':
             width_window = int(
@@ -275,6 +352,17 @@ class PyOS(object):
     def _cls():
         os.system('cls' if os.name == 'nt' else 'clear')
 
+    @staticmethod
+    def serve(file_name, socket_path):
+        if not os.path.exists(file_name):
+            PyOS._format_file(file_name)
+
+        with FileSystem(file_name) as fs, Server(fs, socket_path) as server:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+
     @staticmethod
     def _format_file(file_name):
         print('Происходит создание файловой системы.')
@@ -286,4 +374,14 @@ class PyOS(object):
 
 
 if __name__ == '__main__':
-    PyOS('file').run()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--serve', metavar='SOCKET',
+                        help='Обслуживать образ через Unix-сокет')
+    parser.add_argument('--connect', metavar='SOCKET',
+                        help='Подключиться к запущенному серверу')
+    arguments = parser.parse_args()
+
+    if arguments.serve:
+        PyOS.serve('file', arguments.serve)
+    else:
+        PyOS('file', arguments.connect).run()